@@ -61,10 +61,14 @@ class AFK(commands.Cog):
         view = AFKView(self.bot, ctx.author.id, reason)
         await ctx.send(embed=embed, view=view)
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return
+    async def cog_load(self):
+        self.bot.message_pipeline.register("afk", self.handle_message, concurrent=True, guild_only=False)
+    
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("afk")
+    
+    async def handle_message(self, ctx):
+        message = ctx.message
         
         # Check if user is AFK and remove status
         try:
@@ -267,17 +267,18 @@ class AIChat(commands.Cog):
         
         await ctx.send(embed=embed)
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def cog_load(self):
+        self.bot.message_pipeline.register("ai_chat", self.handle_message, concurrent=True)
+    
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("ai_chat")
+    
+    async def handle_message(self, ctx):
         """Handle AI responses in configured channels"""
-        if message.author.bot:
-            return
-        
-        if not message.guild:
-            return
+        message = ctx.message
         
         # Check if message is in AI channel
-        ai_channel_id = await self.bot.db.get_ai_channel(message.guild.id)
+        ai_channel_id = ctx.config.ai_channel
         if not ai_channel_id or message.channel.id != ai_channel_id:
             return
         
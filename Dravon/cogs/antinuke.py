@@ -1,9 +1,13 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import asyncio
 import time
 from datetime import datetime, timedelta
 from utils.embed_utils import add_dravon_footer
+from utils.audit_log import AuditLogReader
+from utils.rate_tracker import SlidingWindowCounter
+from utils.punishment import PunishmentExecutor
+from utils.guild_snapshot import serialize_guild, GuildRestorer
 from typing import Dict, List, Optional
 
 class AntiNukeSetupView(discord.ui.View):
@@ -104,6 +108,9 @@ class ToggleView(discord.ui.View):
     @discord.ui.button(label="🟢 Enable AntiNuke", style=discord.ButtonStyle.success)
     async def enable_antinuke(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self.bot.db.set_antinuke_rule(self.guild.id, "enabled", {"status": True})
+        antinuke = self.bot.get_cog("AntiNuke")
+        if antinuke:
+            antinuke.schedule_provisioning(self.guild)
         embed = discord.Embed(
             title="✅ AntiNuke Enabled",
             description="Your server is now protected by Dravon™ AntiNuke system!",
@@ -199,11 +206,36 @@ class PunishmentView(discord.ui.View):
         )
         await interaction.response.edit_message(embed=embed, view=None)
 
+# Per protection level: sliding window in seconds, actions by one user before they are
+# punished, and actions that count as a mass nuke. A guild can override any of these
+# per action under protection_level["thresholds"].
+PROTECTION_THRESHOLDS = {
+    "basic": {"window": 10, "punish": 3, "mass": 5},
+    "strong": {"window": 15, "punish": 2, "mass": 4},
+    "extreme": {"window": 30, "punish": 1, "mass": 3},
+}
+# Permissions whose grant counts as escalation, as one bitmask
+DANGEROUS_PERMISSIONS = discord.Permissions(
+    administrator=True, manage_guild=True, manage_roles=True, manage_channels=True,
+    ban_members=True, kick_members=True, manage_webhooks=True
+).value
+
+QUARANTINE_ROLE_NAME = "🔒 Dravon™ Quarantine"
+QUARANTINE_OVERWRITE = discord.PermissionOverwrite(send_messages=False, view_channel=False)
+
+ACTION_THRESHOLDS = {
+    "permission_escalation": {"punish": 1},  # never wait for a second escalation
+}
+
 class AntiNuke(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.action_tracker = {}  # Track suspicious actions
+        self.action_tracker = SlidingWindowCounter(window=30, idle_ttl=120, max_events=100)  # (guild, user, action) -> timestamps
+        self.punished = set()  # (guild, user, action) whose punishment went through this burst
+        self.punishing = set()  # (guild, user, action) with a punishment queued or running
+        self.mass_alerted = set()  # (guild, user, action) already reported as a mass nuke this burst
         self.lockdown_guilds = set()  # Guilds in emergency lockdown
+        self.audit_log = AuditLogReader()  # shared, coalesced audit-log lookups for the listeners below
         self.threat_levels = {
             "channel_delete": "HIGH",
             "mass_channel_delete": "CRITICAL",
@@ -215,6 +247,85 @@ class AntiNuke(commands.Cog):
             "bot_add": "HIGH",
             "permission_escalation": "CRITICAL"
         }
+        self.punisher = PunishmentExecutor()
+        self.quarantine_roles = {}  # guild_id -> quarantine role id
+        self.provisioning = {}  # guild_id -> running provisioning task
+        self.restoring = set()  # guilds with a restore in progress
+        self.role_masks = {}  # guild_id -> {role_id: dangerous permission bits}
+        self.evict_idle_actions.start()
+        self.repair_quarantine.start()
+        self.snapshot_guilds.start()
+    
+    async def cog_unload(self):
+        self.evict_idle_actions.cancel()
+        self.repair_quarantine.cancel()
+        self.snapshot_guilds.cancel()
+        for task in self.provisioning.values():
+            task.cancel()
+        await self.punisher.close()
+    
+    @tasks.loop(minutes=1)
+    async def evict_idle_actions(self):
+        """Forget users with no recent destructive actions"""
+        self.action_tracker.evict_idle()
+        self.punished &= self.action_tracker.events.keys()
+        self.mass_alerted &= self.action_tracker.events.keys()
+    
+    def get_role_masks(self, guild: discord.Guild) -> dict:
+        """Dangerous-permission bits per role, built once per guild and kept current by role events"""
+        masks = self.role_masks.get(guild.id)
+        if masks is None:
+            masks = self.role_masks[guild.id] = {role.id: role.permissions.value & DANGEROUS_PERMISSIONS for role in guild.roles}
+        return masks
+    
+    def dangerous_bits(self, guild: discord.Guild, role_ids) -> int:
+        masks = self.get_role_masks(guild)
+        bits = 0
+        for role_id in role_ids:
+            mask = masks.get(role_id)
+            if mask is None:
+                role = guild.get_role(role_id)
+                mask = masks[role_id] = role.permissions.value & DANGEROUS_PERMISSIONS if role else 0
+            bits |= mask
+        return bits
+    
+    async def get_thresholds(self, guild_id: int, action: str) -> dict:
+        """Thresholds for an action at the guild's protection level"""
+        level = await self.bot.db.get_antinuke_rule(guild_id, "protection_level") or {}
+        thresholds = dict(PROTECTION_THRESHOLDS.get(level.get("level"), PROTECTION_THRESHOLDS["basic"]))
+        thresholds.update(ACTION_THRESHOLDS.get(action, {}))
+        thresholds.update(level.get("thresholds", {}).get(action, {}))
+        # The tracker keeps at most max_events per key, so a higher count could never be reached
+        limit = self.action_tracker.max_events
+        thresholds["punish"] = min(thresholds["punish"], limit)
+        thresholds["mass"] = min(max(thresholds["mass"], thresholds["punish"]), limit)
+        return thresholds
+    
+    async def handle_violation(self, guild: discord.Guild, user: discord.Member, action: str, title: str, details: str, reason: str):
+        """Count a destructive action and punish or escalate once its thresholds are crossed
+        
+        Each threshold fires once per burst, so a 50-channel nuke costs one
+        punishment and one mass alert instead of 50 of each. A punishment that
+        fails is tried again on the actor's next action.
+        """
+        thresholds = await self.get_thresholds(guild.id, action)
+        key = (guild.id, user.id, action)
+        count = self.action_tracker.hit(key, window=thresholds["window"])
+        threat_level = self.threat_levels.get(action, "HIGH")
+        
+        if count < thresholds["punish"]:
+            await self.log_action(guild, f"Suspicious {title}", user, f"{details} ({count}/{thresholds['punish']} before punishment)", "LOW")
+        elif key not in self.punished:
+            if key not in self.punishing:
+                await self.execute_punishment(guild, user, reason, threat_level, key)
+            if count < thresholds["mass"]:
+                await self.log_action(guild, title, user, details, threat_level)
+        
+        if count >= thresholds["mass"] and key not in self.mass_alerted:
+            self.mass_alerted.add(key)
+            mass_level = self.threat_levels.get(f"mass_{action}", "CRITICAL")
+            hint = " Use `antinuke restore` to recover." if action in ("channel_delete", "role_delete") else ""
+            await self.log_action(guild, f"Mass {title}", user, f"{details} ({count} actions in {thresholds['window']}s).{hint}", mass_level)
     
     async def is_owner_only(self, guild, user):
         """Check if user is server owner or extra owner"""
@@ -256,29 +367,109 @@ class AntiNuke(commands.Cog):
         return False
     
     async def get_quarantine_role(self, guild: discord.Guild):
-        """Get or create quarantine role"""
-        role = discord.utils.get(guild.roles, name="🔒 Dravon™ Quarantine")
+        """Get or create quarantine role
+        
+        The role is normally provisioned when AntiNuke is enabled. If it is missing
+        mid-attack it is created bare and its channel overwrites are applied in the
+        background, so the punishment itself never waits on them.
+        """
+        role = guild.get_role(self.quarantine_roles.get(guild.id, 0)) or discord.utils.get(guild.roles, name=QUARANTINE_ROLE_NAME)
         if not role:
             role = await guild.create_role(
-                name="🔒 Dravon™ Quarantine",
+                name=QUARANTINE_ROLE_NAME,
                 color=0x2c2c2c,
                 permissions=discord.Permissions.none(),
                 reason="AntiNuke Quarantine Role"
             )
-            # Lock role in all channels
-            for channel in guild.channels:
+            self.quarantine_roles[guild.id] = role.id
+            self.schedule_provisioning(guild)
+        self.quarantine_roles[guild.id] = role.id
+        return role
+    
+    async def provision_quarantine(self, guild: discord.Guild, concurrency: int = 5) -> int:
+        """Create the quarantine role and fix every channel whose overwrite drifted
+        
+        Returns how many channels were repaired.
+        """
+        role = await self.get_quarantine_role(guild)
+        drifted = [channel for channel in guild.channels if channel.overwrites_for(role) != QUARANTINE_OVERWRITE]
+        slots = asyncio.Semaphore(concurrency)
+        
+        async def lock(channel):
+            async with slots:
                 try:
-                    await channel.set_permissions(role, send_messages=False, view_channel=False)
+                    await channel.set_permissions(role, overwrite=QUARANTINE_OVERWRITE, reason="AntiNuke Quarantine Role")
+                    return True
                 except:
-                    pass
-        return role
+                    return False
+        
+        results = await asyncio.gather(*(lock(channel) for channel in drifted))
+        return sum(results)
+    
+    def schedule_provisioning(self, guild: discord.Guild):
+        """Provision in the background, joining a run that is already going"""
+        task = self.provisioning.get(guild.id)
+        if task and not task.done():
+            return task
+        task = self.provisioning[guild.id] = asyncio.create_task(self.provision_quarantine(guild))
+        task.add_done_callback(lambda _: self.provisioning.pop(guild.id, None))
+        return task
+    
+    @tasks.loop(minutes=30)
+    async def repair_quarantine(self):
+        """Keep quarantine overwrites in place on every protected guild, a few guilds at a time"""
+        slots = asyncio.Semaphore(5)
+        
+        async def repair(guild):
+            async with slots:
+                try:
+                    enabled = await self.bot.db.get_antinuke_rule(guild.id, "enabled")
+                    if enabled and enabled.get("status"):
+                        await self.schedule_provisioning(guild)
+                except Exception as e:
+                    print(f"AntiNuke quarantine repair error in {guild.id}: {e}")
+        
+        await asyncio.gather(*(repair(guild) for guild in self.bot.guilds))
     
-    async def execute_punishment(self, guild: discord.Guild, user: discord.Member, reason: str):
-        """Execute the configured punishment"""
+    @repair_quarantine.before_loop
+    async def before_repair_quarantine(self):
+        await self.bot.wait_until_ready()
+    
+    def is_under_attack(self, guild_id: int) -> bool:
+        """Recent destructive actions or lockdown; snapshots must not record a half-nuked guild"""
+        if guild_id in self.lockdown_guilds or guild_id in self.restoring:
+            return True
+        return any(key[0] == guild_id and timestamps for key, timestamps in self.action_tracker.events.items())
+    
+    async def take_snapshot(self, guild: discord.Guild):
+        """Store the guild's roles, categories, channels and overwrites; only changes are written"""
+        return await self.bot.db.save_guild_snapshot(guild.id, serialize_guild(guild))
+    
+    @tasks.loop(minutes=15)
+    async def snapshot_guilds(self):
+        """Keep a recent structure snapshot of every protected guild"""
+        for guild in self.bot.guilds:
+            try:
+                enabled = await self.bot.db.get_antinuke_rule(guild.id, "enabled")
+                if enabled and enabled.get("status") and not self.is_under_attack(guild.id):
+                    await self.take_snapshot(guild)
+            except Exception as e:
+                print(f"AntiNuke snapshot error in {guild.id}: {e}")
+    
+    @snapshot_guilds.before_loop
+    async def before_snapshot_guilds(self):
+        await self.bot.wait_until_ready()
+    
+    async def execute_punishment(self, guild: discord.Guild, user: discord.Member, reason: str, threat_level: str = "HIGH", burst=None):
+        """Queue the configured punishment without waiting for it
+        
+        The outcome is logged from a callback; if it went through, burst (the
+        (guild, user, action) being punished) is marked as punished.
+        """
         punishment_config = await self.bot.db.get_antinuke_rule(guild.id, "punishment")
         punishment_type = punishment_config.get("type", "quarantine") if punishment_config else "quarantine"
         
-        try:
+        async def punish():
             if punishment_type == "quarantine":
                 quarantine_role = await self.get_quarantine_role(guild)
                 await user.add_roles(quarantine_role, reason=f"AntiNuke: {reason}")
@@ -288,8 +479,22 @@ class AntiNuke(commands.Cog):
                 await user.ban(reason=f"AntiNuke: {reason}")
             elif punishment_type == "strip_roles":
                 await user.edit(roles=[], reason=f"AntiNuke: {reason}")
-        except Exception as e:
-            print(f"AntiNuke punishment failed: {e}")
+        
+        severity = PunishmentExecutor.SEVERITY.get(punishment_type, 0)
+        future = self.punisher.submit(guild.id, user.id, punish, threat_level, severity)
+        if burst is not None:
+            self.punishing.add(burst)
+        future.add_done_callback(lambda done: self.punishment_done(burst, done))
+    
+    def punishment_done(self, burst, future):
+        self.punishing.discard(burst)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            print(f"AntiNuke punishment failed: {error}")
+        elif burst is not None:
+            self.punished.add(burst)
     
     async def log_action(self, guild: discord.Guild, action: str, user: discord.Member, details: str, threat_level: str = "HIGH"):
         """Log security action with enhanced formatting"""
@@ -554,6 +759,7 @@ class AntiNuke(commands.Cog):
         
         # Actually configure the system
         await self.bot.db.set_antinuke_rule(ctx.guild.id, "enabled", {"status": True})
+        self.schedule_provisioning(ctx.guild)
         await self.bot.db.set_antinuke_rule(ctx.guild.id, "protection_level", {"level": "strong"})
         await self.bot.db.set_antinuke_rule(ctx.guild.id, "punishment", {"type": "quarantine"})
         
@@ -979,6 +1185,7 @@ class AntiNuke(commands.Cog):
         status_color = 0x00FF00 if is_enabled else 0xFF0000
         
         protection_level = level.get("level", "basic").upper() if level else "BASIC"
+        thresholds = PROTECTION_THRESHOLDS.get(protection_level.lower(), PROTECTION_THRESHOLDS["basic"])
         punishment_type = punishment.get("type", "quarantine").replace("_", " ").title() if punishment else "Quarantine"
         whitelist_count = len(whitelist.get("users", [])) if whitelist else 0
         logs_channel = f"<#{logs.get('channel_id')}>" if logs and logs.get('channel_id') else "Not Set"
@@ -992,7 +1199,7 @@ class AntiNuke(commands.Cog):
         # Protection settings
         embed.add_field(
             name="⚡ Protection Settings",
-            value=f"**Level:** {protection_level}\n**Punishment:** {punishment_type}\n**Response Time:** {'<1s' if protection_level == 'EXTREME' else '1-2s' if protection_level == 'STRONG' else '3-5s'}",
+            value=f"**Level:** {protection_level}\n**Punishment:** {punishment_type}\n**Response Time:** {'<1s' if protection_level == 'EXTREME' else '1-2s' if protection_level == 'STRONG' else '3-5s'}\n**Punish After:** {thresholds['punish']} action(s) in {thresholds['window']}s\n**Mass Nuke At:** {thresholds['mass']} actions",
             inline=True
         )
         
@@ -1089,6 +1296,66 @@ class AntiNuke(commands.Cog):
         
         await ctx.send(embed=confirm_embed, view=view)
     
+    @antinuke_group.command(name="snapshot")
+    async def antinuke_snapshot(self, ctx):
+        """Save the current server structure for restore (Owner only)"""
+        if not await self.is_owner_only(ctx.guild, ctx.author):
+            await ctx.send("❌ Only server owners and extra owners can take snapshots.")
+            return
+        
+        if self.is_under_attack(ctx.guild.id):
+            await ctx.send("⚠️ Destructive actions were detected recently; wait for things to settle before taking a snapshot.")
+            return
+        
+        changed, deleted = await self.take_snapshot(ctx.guild)
+        embed = discord.Embed(
+            title="📸 Snapshot Saved",
+            description=f"**Roles, categories, channels and permissions saved.**\n\n**Changed:** {changed}\n**Removed:** {deleted}",
+            color=0x00ff00
+        )
+        embed.set_footer(text="AntiNuke v6.0 • Powered by Dravon™", icon_url=self.bot.user.display_avatar.url)
+        await ctx.send(embed=embed)
+    
+    @antinuke_group.command(name="restore")
+    async def antinuke_restore(self, ctx, minutes: int = 60):
+        """Recreate roles and channels deleted in the last few minutes (Owner only)"""
+        if not await self.is_owner_only(ctx.guild, ctx.author):
+            await ctx.send("❌ Only server owners and extra owners can restore the server.")
+            return
+        
+        if ctx.guild.id in self.restoring:
+            await ctx.send("⏳ A restore is already running for this server.")
+            return
+        
+        snapshot = await self.bot.db.get_guild_snapshot(ctx.guild.id, deleted_since=time.time() - minutes * 60)
+        if not snapshot:
+            await ctx.send("❌ No snapshot found for this server. Use `antinuke snapshot` while it is healthy.")
+            return
+        
+        message = await ctx.send(embed=discord.Embed(
+            title="🔄 Restoring Server",
+            description="**Recreating roles, then categories, channels and permissions...**",
+            color=0xffd700
+        ))
+        self.restoring.add(ctx.guild.id)
+        try:
+            restored, failed, elapsed = await GuildRestorer(ctx.guild, snapshot).run()
+        finally:
+            self.restoring.discard(ctx.guild.id)
+        
+        embed = discord.Embed(
+            title="✅ Restore Complete" if not failed else "⚠️ Restore Finished With Errors",
+            description=(
+                f"**Roles:** {restored['roles']}\n**Categories:** {restored['categories']}\n"
+                f"**Channels:** {restored['channels']}\n**Permission Overwrites:** {restored['overwrites']}\n"
+                f"**Failed:** {failed}\n**Time:** {elapsed:.1f}s"
+            ),
+            color=0x00ff00 if not failed else 0xff8c00
+        )
+        embed.set_footer(text="AntiNuke v6.0 • Powered by Dravon™", icon_url=self.bot.user.display_avatar.url)
+        await message.edit(embed=embed)
+        await self.log_action(ctx.guild, "Server Restore", ctx.author, f"Restored {sum(restored.values())} objects from snapshot", "MEDIUM")
+    
     @antinuke_group.command(name="emergency")
     async def emergency_lockdown(self, ctx):
         """Emergency server lockdown (Owner/Admin only)"""
@@ -1124,6 +1391,21 @@ class AntiNuke(commands.Cog):
         # Log the emergency action
         await self.log_action(ctx.guild, "Emergency Lockdown Toggled", ctx.author, f"Lockdown {'activated' if ctx.guild.id in self.lockdown_guilds else 'deactivated'} by {ctx.author}", "CRITICAL")
     
+    @commands.Cog.listener()
+    async def on_audit_log_entry_create(self, entry):
+        """Gateway-pushed audit entries answer the listeners below without a REST fetch"""
+        self.audit_log.feed(entry)
+    
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        """Lock new channels for the quarantine role straight away"""
+        role = channel.guild.get_role(self.quarantine_roles.get(channel.guild.id, 0))
+        if role:
+            try:
+                await channel.set_permissions(role, overwrite=QUARANTINE_OVERWRITE, reason="AntiNuke Quarantine Role")
+            except:
+                pass
+    
     @commands.Cog.listener()
     async def on_guild_ban(self, guild, user):
         """Detect unauthorized bans"""
@@ -1132,14 +1414,12 @@ class AntiNuke(commands.Cog):
             if not enabled or not enabled.get("status"):
                 return
             
-            async for entry in guild.audit_logs(action=discord.AuditLogAction.ban, limit=1):
-                if entry.target.id == user.id:
-                    if await self.is_whitelisted(guild.id, entry.user.id):
-                        return
-                    
-                    await self.execute_punishment(guild, entry.user, "Unauthorized ban")
-                    await self.log_action(guild, "Unauthorized Ban", entry.user, f"Banned {user}", "HIGH")
-                    break
+            entry = await self.audit_log.find(guild, discord.AuditLogAction.ban, user.id)
+            if entry and self.audit_log.claim(entry):
+                if await self.is_whitelisted(guild.id, entry.user.id):
+                    return
+                
+                await self.handle_violation(guild, entry.user, "member_ban", "Unauthorized Ban", f"Banned {user}", "Unauthorized ban")
         except Exception as e:
             print(f"AntiNuke ban detection error: {e}")
     
@@ -1151,33 +1431,49 @@ class AntiNuke(commands.Cog):
             if not enabled or not enabled.get("status"):
                 return
             
-            async for entry in channel.guild.audit_logs(action=discord.AuditLogAction.channel_delete, limit=1):
-                if entry.target.id == channel.id:
-                    if await self.is_whitelisted(channel.guild.id, entry.user.id):
-                        return
-                    
-                    await self.execute_punishment(channel.guild, entry.user, "Unauthorized channel deletion")
-                    await self.log_action(channel.guild, "Channel Deletion", entry.user, f"Deleted #{channel.name}", "HIGH")
-                    break
+            entry = await self.audit_log.find(channel.guild, discord.AuditLogAction.channel_delete, channel.id)
+            if entry and self.audit_log.claim(entry):
+                if await self.is_whitelisted(channel.guild.id, entry.user.id):
+                    return
+                
+                await self.handle_violation(channel.guild, entry.user, "channel_delete", "Channel Deletion", f"Deleted #{channel.name}", "Unauthorized channel deletion")
         except Exception as e:
             print(f"AntiNuke channel deletion error: {e}")
     
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        masks = self.role_masks.get(role.guild.id)
+        if masks is not None:
+            masks[role.id] = role.permissions.value & DANGEROUS_PERMISSIONS
+    
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        masks = self.role_masks.get(after.guild.id)
+        if masks is not None:
+            masks[after.id] = after.permissions.value & DANGEROUS_PERMISSIONS
+    
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.role_masks.pop(guild.id, None)
+    
     @commands.Cog.listener()
     async def on_guild_role_delete(self, role):
         """Detect unauthorized role deletions"""
+        masks = self.role_masks.get(role.guild.id)
+        if masks is not None:
+            masks.pop(role.id, None)
+        
         try:
             enabled = await self.bot.db.get_antinuke_rule(role.guild.id, "enabled")
             if not enabled or not enabled.get("status"):
                 return
             
-            async for entry in role.guild.audit_logs(action=discord.AuditLogAction.role_delete, limit=1):
-                if entry.target.id == role.id:
-                    if await self.is_whitelisted(role.guild.id, entry.user.id):
-                        return
-                    
-                    await self.execute_punishment(role.guild, entry.user, "Unauthorized role deletion")
-                    await self.log_action(role.guild, "Role Deletion", entry.user, f"Deleted role {role.name}", "HIGH")
-                    break
+            entry = await self.audit_log.find(role.guild, discord.AuditLogAction.role_delete, role.id)
+            if entry and self.audit_log.claim(entry):
+                if await self.is_whitelisted(role.guild.id, entry.user.id):
+                    return
+                
+                await self.handle_violation(role.guild, entry.user, "role_delete", "Role Deletion", f"Deleted role {role.name}", "Unauthorized role deletion")
         except Exception as e:
             print(f"AntiNuke role deletion error: {e}")
     
@@ -1189,13 +1485,13 @@ class AntiNuke(commands.Cog):
             if not enabled or not enabled.get("status"):
                 return
             
-            async for entry in channel.guild.audit_logs(action=discord.AuditLogAction.webhook_create, limit=1):
+            # webhooks_update carries no webhook id, so take the newest creation not yet acted on
+            entry = await self.audit_log.find(channel.guild, discord.AuditLogAction.webhook_create)
+            if entry and self.audit_log.claim(entry):
                 if await self.is_whitelisted(channel.guild.id, entry.user.id):
                     return
                 
-                await self.execute_punishment(channel.guild, entry.user, "Unauthorized webhook creation")
-                await self.log_action(channel.guild, "Webhook Creation", entry.user, f"Created webhook in #{channel.name}", "MEDIUM")
-                break
+                await self.handle_violation(channel.guild, entry.user, "webhook_create", "Webhook Creation", f"Created webhook in #{channel.name}", "Unauthorized webhook creation")
         except Exception as e:
             print(f"AntiNuke webhook detection error: {e}")
 
@@ -1203,38 +1499,26 @@ class AntiNuke(commands.Cog):
     async def on_member_update(self, before, after):
         """Detect unauthorized permission escalation"""
         try:
-            enabled = await self.bot.db.get_antinuke_rule(after.guild.id, "enabled")
-            if not enabled or not enabled.get("status"):
+            # Nickname, avatar and timeout updates carry no new roles; skip them before any lookup
+            before_roles = {role.id for role in before.roles}
+            added_roles = {role.id for role in after.roles} - before_roles
+            if not added_roles:
                 return
             
-            dangerous_perms = [
-                'administrator', 'manage_guild', 'manage_roles', 'manage_channels',
-                'ban_members', 'kick_members', 'manage_webhooks'
-            ]
-            
-            before_perms = set()
-            after_perms = set()
-            
-            for role in before.roles:
-                for perm, value in role.permissions:
-                    if value and perm in dangerous_perms:
-                        before_perms.add(perm)
+            new_perms = self.dangerous_bits(after.guild, added_roles) & ~self.dangerous_bits(after.guild, before_roles)
+            if not new_perms:
+                return
             
-            for role in after.roles:
-                for perm, value in role.permissions:
-                    if value and perm in dangerous_perms:
-                        after_perms.add(perm)
+            enabled = await self.bot.db.get_antinuke_rule(after.guild.id, "enabled")
+            if not enabled or not enabled.get("status"):
+                return
             
-            new_perms = after_perms - before_perms
-            if new_perms:
-                async for entry in after.guild.audit_logs(action=discord.AuditLogAction.member_role_update, limit=1):
-                    if entry.target.id == after.id:
-                        if await self.is_whitelisted(after.guild.id, entry.user.id):
-                            return
-                        
-                        await self.execute_punishment(after.guild, entry.user, "Unauthorized permission escalation")
-                        await self.log_action(after.guild, "Permission Escalation", entry.user, f"Granted dangerous permissions to {after}", "CRITICAL")
-                        break
+            entry = await self.audit_log.find(after.guild, discord.AuditLogAction.member_role_update, after.id)
+            if entry and self.audit_log.claim(entry):
+                if await self.is_whitelisted(after.guild.id, entry.user.id):
+                    return
+                
+                await self.handle_violation(after.guild, entry.user, "permission_escalation", "Permission Escalation", f"Granted dangerous permissions to {after}", "Unauthorized permission escalation")
         except Exception as e:
             print(f"AntiNuke permission escalation error: {e}")
 
@@ -506,11 +506,15 @@ class Apply(commands.Cog):
         except Exception as e:
             await ctx.send(f"❌ Error: {str(e)}")
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def cog_load(self):
+        self.bot.message_pipeline.register("apply", self.handle_message, concurrent=True)
+    
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("apply")
+    
+    async def handle_message(self, ctx):
         """Handle channel and role setup"""
-        if message.author.bot:
-            return
+        message = ctx.message
         
         # Handle channel setup
         if message.content.startswith("<#") and message.content.endswith(">"):
@@ -1,8 +1,11 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import re
 import asyncio
 from datetime import datetime, timedelta
+from utils.text_matcher import WordFilter, normalize
+from utils.rate_tracker import MessageRateTracker
+from utils.fingerprint import FingerprintStore, simhash, normalize as fingerprint_text
 
 class AutoMod(commands.Cog):
     def __init__(self, bot):
@@ -14,8 +17,6 @@ class AutoMod(commands.Cog):
         self.spam_filter = set()
         self.nsfw_filter = set()
         self.whitelisted_users = {}
-        self.user_message_count = {}
-        self.user_last_message = {}
         
         # Enhanced bad words list
         self.bad_words = [
@@ -23,10 +24,33 @@ class AutoMod(commands.Cog):
             'whore', 'nigger', 'nigga', 'faggot', 'retard', 'cunt', 'pussy', 'dick', 'cock',
             'penis', 'vagina', 'sex', 'porn', 'nude', 'naked', 'xxx', 'anal', 'oral', 'rape'
         ]
+        self.word_filters = {}  # guild_id -> (profanity_filter config it was built from, WordFilter)
         
-        # Spam detection
+        # Spam detection (defaults; guilds can override via the spam_filter rule)
         self.spam_threshold = 5  # messages
         self.spam_time_window = 10  # seconds
+        self.message_rates = MessageRateTracker(window=self.spam_time_window)
+        
+        # Near-duplicate detection (defaults; guilds can override via the duplicate_filter rule)
+        self.duplicate_defaults = {"window": 30, "channels": 3, "users": 4, "distance": 6}
+        self.fingerprints = {}  # guild_id -> FingerprintStore
+        self.evict_idle_rates.start()
+    
+    async def cog_load(self):
+        self.bot.message_pipeline.register("automod", self.handle_message, priority=10)
+    
+    async def cog_unload(self):
+        self.evict_idle_rates.cancel()
+        self.bot.message_pipeline.unregister("automod")
+    
+    @tasks.loop(minutes=1)
+    async def evict_idle_rates(self):
+        """Forget users, channels and guilds that have gone quiet"""
+        self.message_rates.evict_idle()
+        for guild_id, store in list(self.fingerprints.items()):
+            store.evict()
+            if not store:
+                del self.fingerprints[guild_id]
     
     async def is_owner_or_extra(self, guild, user):
         """Check if user is server owner or extra owner"""
@@ -48,23 +72,38 @@ class AutoMod(commands.Cog):
         if user_id == guild.owner_id:
             return True
         
-        # Check extra owners
+        # Extra owners and antinuke whitelist come from the cached guild snapshot
         try:
-            extra_owners = await self.bot.db.get_extra_owners(guild_id)
-            if user_id in extra_owners:
-                return True
+            config = await self.bot.db.get_guild_config(guild_id)
+            return config.is_whitelisted(user_id)
         except:
-            pass
+            return False
+    
+    async def enable_rule(self, guild_id, rule_type):
+        """Turn a filter on without dropping its custom settings (word list, thresholds)"""
+        config = await self.bot.db.get_automod_rule(guild_id, rule_type) or {}
+        config["enabled"] = True
+        await self.bot.db.set_automod_rule(guild_id, rule_type, config)
+    
+    def get_word_filter(self, guild_id, profanity_filter):
+        """Compiled matcher for the guild's word list, rebuilt only when its config changes"""
+        cached = self.word_filters.get(guild_id)
+        # Snapshot rules are replaced (not mutated) on every write, so identity means unchanged
+        if cached and cached[0] is profanity_filter:
+            return cached[1]
         
-        # Check antinuke whitelist
-        try:
-            antinuke_whitelist = await self.bot.db.get_antinuke_rule(guild_id, "whitelist")
-            if antinuke_whitelist and user_id in antinuke_whitelist.get("users", []):
-                return True
-        except:
-            pass
+        words = self.bad_words + profanity_filter.get("words", [])
+        word_boundary = profanity_filter.get("word_boundary", False)
+        leetspeak = profanity_filter.get("leetspeak", False)
         
-        return False
+        word_filter = cached[1] if cached else None
+        if word_filter and word_filter.word_boundary == word_boundary and word_filter.leetspeak == leetspeak:
+            word_filter.update(words)
+        else:
+            word_filter = WordFilter(words, word_boundary=word_boundary, leetspeak=leetspeak)
+        
+        self.word_filters[guild_id] = (profanity_filter, word_filter)
+        return word_filter
     
     async def notify_owner(self, guild, action, user, details):
         """Send DM to server owner about security events"""
@@ -140,9 +179,9 @@ class AutoMod(commands.Cog):
         async def enable_callback(interaction):
             await self.bot.db.set_automod_rule(ctx.guild.id, "enabled", {"status": True})
             await self.bot.db.set_automod_rule(ctx.guild.id, "link_filter", {"enabled": True})
-            await self.bot.db.set_automod_rule(ctx.guild.id, "profanity_filter", {"enabled": True})
+            await self.enable_rule(ctx.guild.id, "profanity_filter")
             await self.bot.db.set_automod_rule(ctx.guild.id, "caps_filter", {"enabled": True})
-            await self.bot.db.set_automod_rule(ctx.guild.id, "spam_filter", {"enabled": True})
+            await self.enable_rule(ctx.guild.id, "spam_filter")
             
             embed = discord.Embed(
                 title="✅ AutoMod Enabled",
@@ -174,13 +213,13 @@ class AutoMod(commands.Cog):
         """Enable AutoMod with all filters"""
         await self.bot.db.set_automod_rule(ctx.guild.id, "enabled", {"status": True})
         await self.bot.db.set_automod_rule(ctx.guild.id, "link_filter", {"enabled": True})
-        await self.bot.db.set_automod_rule(ctx.guild.id, "profanity_filter", {"enabled": True})
+        await self.enable_rule(ctx.guild.id, "profanity_filter")
         await self.bot.db.set_automod_rule(ctx.guild.id, "caps_filter", {"enabled": True})
-        await self.bot.db.set_automod_rule(ctx.guild.id, "spam_filter", {"enabled": True})
+        await self.enable_rule(ctx.guild.id, "spam_filter")
         
         embed = discord.Embed(
             title="✅ AutoMod Enabled",
-            description="**All filters activated:**\n• Link Filter\n• Profanity Filter\n• Caps Filter\n• Spam Filter\n• NSFW Filter",
+            description="**All filters activated:**\n• Link Filter\n• Profanity Filter\n• Caps Filter\n• Spam Filter\n• NSFW Filter\n\nThe duplicate filter is opt-in: `automod duplicates on`",
             color=0x00ff00
         )
         await ctx.send(embed=embed)
@@ -206,12 +245,14 @@ class AutoMod(commands.Cog):
             profanity_filter = await self.bot.db.get_automod_rule(ctx.guild.id, "profanity_filter")
             caps_filter = await self.bot.db.get_automod_rule(ctx.guild.id, "caps_filter")
             spam_filter = await self.bot.db.get_automod_rule(ctx.guild.id, "spam_filter")
+            duplicate_filter = await self.bot.db.get_automod_rule(ctx.guild.id, "duplicate_filter")
         except:
             enabled = None
             link_filter = None
             profanity_filter = None
             caps_filter = None
             spam_filter = None
+            duplicate_filter = None
         
         status = "🟢 Enabled" if enabled and enabled.get("status") else "🔴 Disabled"
         
@@ -226,6 +267,7 @@ class AutoMod(commands.Cog):
         filters_status.append(f"🤬 Profanity Filter: {'✅' if profanity_filter and profanity_filter.get('enabled') else '❌'}")
         filters_status.append(f"📢 Caps Filter: {'✅' if caps_filter and caps_filter.get('enabled') else '❌'}")
         filters_status.append(f"🚫 Spam Filter: {'✅' if spam_filter and spam_filter.get('enabled') else '❌'}")
+        filters_status.append(f"📋 Duplicate Filter: {'✅' if duplicate_filter and duplicate_filter.get('enabled') else '❌'}")
         
         embed.add_field(
             name="🛡️ Active Filters",
@@ -235,22 +277,31 @@ class AutoMod(commands.Cog):
         
         await ctx.send(embed=embed)
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    
+    async def notify(self, message, text):
+        """Short-lived warning in the channel, at most one per user every 5 seconds"""
+        if self.bot.cooldowns.trigger(("automod", message.guild.id, message.author.id), 5):
+            await message.channel.send(text, delete_after=5)
+    
+    async def handle_message(self, ctx):
         """Enhanced message filtering"""
-        if message.author.bot or not message.guild:
-            return
+        message = ctx.message
+        config = ctx.config
+        
+        # Rate counters run for every message so raid detection sees the full traffic
+        spam_filter = config.automod.get("spam_filter") or {}
+        recent_messages = self.message_rates.record(
+            message.guild.id, message.channel.id, message.author.id,
+            window=spam_filter.get("window", self.spam_time_window)
+        )
         
         # Check if AutoMod is enabled
-        try:
-            enabled = await self.bot.db.get_automod_rule(message.guild.id, "enabled")
-            if not enabled or not enabled.get("status"):
-                return
-        except:
+        enabled = config.automod.get("enabled")
+        if not enabled or not enabled.get("status"):
             return
         
         # Check if user is whitelisted (owner, extra owner, or antinuke whitelist)
-        if await self.is_whitelisted(message.guild.id, message.author.id):
+        if ctx.is_whitelisted:
             return
         
         # Users with Administrator permission should NOT bypass (as requested)
@@ -261,12 +312,12 @@ class AutoMod(commands.Cog):
         
         # Link Filter
         try:
-            link_filter = await self.bot.db.get_automod_rule(message.guild.id, "link_filter")
+            link_filter = config.automod.get("link_filter")
             if link_filter and link_filter.get("enabled"):
                 if re.search(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', message.content):
                     try:
                         await message.delete()
-                        await message.channel.send(f"🔗 {message.author.mention}, links are not allowed!", delete_after=5)
+                        await self.notify(message, f"🔗 {message.author.mention}, links are not allowed!")
                         deleted = True
                         violation_type = "Link Filter"
                     except:
@@ -277,32 +328,32 @@ class AutoMod(commands.Cog):
         # Profanity Filter
         if not deleted:
             try:
-                profanity_filter = await self.bot.db.get_automod_rule(message.guild.id, "profanity_filter")
+                profanity_filter = config.automod.get("profanity_filter")
                 if profanity_filter and profanity_filter.get("enabled"):
-                    for word in self.bad_words:
-                        if word.lower() in message.content.lower():
-                            try:
-                                await message.delete()
-                                await message.channel.send(f"🤬 {message.author.mention}, inappropriate language detected!", delete_after=5)
-                                deleted = True
-                                violation_type = "Profanity Filter"
-                                break
-                            except:
-                                pass
+                    word_filter = self.get_word_filter(message.guild.id, profanity_filter)
+                    content = ctx.content_lower if not word_filter.leetspeak else normalize(message.content, True)
+                    if word_filter.find(message.content, normalized=content):
+                        try:
+                            await message.delete()
+                            await self.notify(message, f"🤬 {message.author.mention}, inappropriate language detected!")
+                            deleted = True
+                            violation_type = "Profanity Filter"
+                        except:
+                            pass
             except:
                 pass
         
         # Caps Filter
         if not deleted:
             try:
-                caps_filter = await self.bot.db.get_automod_rule(message.guild.id, "caps_filter")
+                caps_filter = config.automod.get("caps_filter")
                 if caps_filter and caps_filter.get("enabled"):
                     if len(message.content) > 10:
                         caps_count = sum(1 for c in message.content if c.isupper())
                         if caps_count / len(message.content) > 0.7:  # 70% caps
                             try:
                                 await message.delete()
-                                await message.channel.send(f"📢 {message.author.mention}, please don't use excessive caps!", delete_after=5)
+                                await self.notify(message, f"📢 {message.author.mention}, please don't use excessive caps!")
                                 deleted = True
                                 violation_type = "Caps Filter"
                             except:
@@ -313,28 +364,12 @@ class AutoMod(commands.Cog):
         # Spam Filter
         if not deleted:
             try:
-                spam_filter = await self.bot.db.get_automod_rule(message.guild.id, "spam_filter")
-                if spam_filter and spam_filter.get("enabled"):
-                    user_id = message.author.id
-                    current_time = datetime.now()
-                    
-                    if user_id not in self.user_message_count:
-                        self.user_message_count[user_id] = []
-                    
-                    # Remove old messages outside time window
-                    self.user_message_count[user_id] = [
-                        msg_time for msg_time in self.user_message_count[user_id]
-                        if (current_time - msg_time).seconds < self.spam_time_window
-                    ]
-                    
-                    # Add current message
-                    self.user_message_count[user_id].append(current_time)
-                    
+                if spam_filter.get("enabled"):
                     # Check if spam threshold exceeded
-                    if len(self.user_message_count[user_id]) >= self.spam_threshold:
+                    if recent_messages >= spam_filter.get("threshold", self.spam_threshold):
                         try:
                             await message.delete()
-                            await message.channel.send(f"🚫 {message.author.mention}, slow down! You're sending messages too fast!", delete_after=5)
+                            await self.notify(message, f"🚫 {message.author.mention}, slow down! You're sending messages too fast!")
                             deleted = True
                             violation_type = "Spam Filter"
                             
@@ -348,11 +383,178 @@ class AutoMod(commands.Cog):
             except:
                 pass
         
+        # Duplicate Filter: the same text pasted across channels or by several accounts
+        if not deleted:
+            try:
+                duplicate_filter = config.automod.get("duplicate_filter") or {}
+                if duplicate_filter.get("enabled") and await self.check_duplicates(message, duplicate_filter):
+                    deleted = True
+                    violation_type = "Duplicate Spam"
+            except:
+                pass
+        
         # Log violation and notify owner
         if deleted:
+            ctx.mark_deleted("automod")
             await self.log_action(message.guild, violation_type, message.author, f"Message deleted: {message.content[:100]}...")
             await self.notify_owner(message.guild, violation_type, message.author, f"Violated {violation_type.lower()}")
     
+    async def check_duplicates(self, message, duplicate_filter):
+        """Fingerprint the message and delete it with its recent copies once they spread too far"""
+        text = fingerprint_text(message.content)
+        if len(text) < 10:
+            return False
+        
+        settings = {**self.duplicate_defaults, **duplicate_filter}
+        store = self.fingerprints.get(message.guild.id)
+        if store is None or store.window != settings["window"]:
+            store = self.fingerprints[message.guild.id] = FingerprintStore(window=settings["window"])
+        
+        matches = store.add_and_match(
+            simhash(text), message.channel.id, message.author.id, message.id,
+            max_distance=settings["distance"]
+        )
+        if not matches:
+            return False
+        
+        channels = {entry.channel_id for entry in matches} | {message.channel.id}
+        users = {entry.user_id for entry in matches} | {message.author.id}
+        if len(channels) < settings["channels"] and len(users) < settings["users"]:
+            return False
+        
+        try:
+            await message.delete()
+        except discord.HTTPException:
+            pass
+        for entry in matches:
+            channel = message.guild.get_channel_or_thread(entry.channel_id)
+            if channel:
+                try:
+                    await channel.get_partial_message(entry.message_id).delete()
+                except discord.HTTPException:
+                    pass
+        store.forget(matches)
+        return True
+    
+    @automod_group.group(name="words")
+    async def words_group(self, ctx):
+        """Manage the custom profanity word list"""
+        if ctx.invoked_subcommand is None:
+            await ctx.send("Use `automod words add/remove/list/mode/leetspeak` to manage blocked words.")
+    
+    async def update_profanity_filter(self, ctx, **changes):
+        if not await self.is_owner_or_extra(ctx.guild, ctx.author):
+            await ctx.send("❌ Only server owners and extra owners can manage AutoMod words.")
+            return None
+        
+        config = await self.bot.db.get_automod_rule(ctx.guild.id, "profanity_filter") or {"enabled": False}
+        config.update(changes)
+        await self.bot.db.set_automod_rule(ctx.guild.id, "profanity_filter", config)
+        return config
+    
+    @words_group.command(name="add")
+    async def words_add(self, ctx, *, word: str):
+        """Block a custom word"""
+        config = await self.bot.db.get_automod_rule(ctx.guild.id, "profanity_filter") or {}
+        words = config.get("words", [])
+        word = word.lower().strip()
+        if word in words:
+            await ctx.send(f"`{word}` is already blocked.")
+            return
+        
+        if await self.update_profanity_filter(ctx, words=words + [word]) is not None:
+            await ctx.send(f"✅ Added `{word}` to the blocked words.")
+    
+    @words_group.command(name="remove")
+    async def words_remove(self, ctx, *, word: str):
+        """Unblock a custom word"""
+        config = await self.bot.db.get_automod_rule(ctx.guild.id, "profanity_filter") or {}
+        words = config.get("words", [])
+        word = word.lower().strip()
+        if word not in words:
+            await ctx.send(f"`{word}` is not in the custom word list.")
+            return
+        
+        if await self.update_profanity_filter(ctx, words=[w for w in words if w != word]) is not None:
+            await ctx.send(f"✅ Removed `{word}` from the blocked words.")
+    
+    @words_group.command(name="list")
+    async def words_list(self, ctx):
+        """Show custom blocked words"""
+        config = await self.bot.db.get_automod_rule(ctx.guild.id, "profanity_filter") or {}
+        words = config.get("words", [])
+        embed = discord.Embed(
+            title="🤬 Custom Blocked Words",
+            description=", ".join(f"||{w}||" for w in words) if words else "No custom words added.",
+            color=0x7289da
+        )
+        embed.add_field(name="Match Mode", value="Whole words" if config.get("word_boundary") else "Anywhere in text", inline=True)
+        embed.add_field(name="Leetspeak", value="✅" if config.get("leetspeak") else "❌", inline=True)
+        await ctx.send(embed=embed)
+    
+    @words_group.command(name="mode")
+    async def words_mode(self, ctx, mode: str):
+        """Match words anywhere (substring) or only as whole words (boundary)"""
+        mode = mode.lower()
+        if mode not in ("substring", "boundary"):
+            await ctx.send("Mode must be `substring` or `boundary`.")
+            return
+        
+        if await self.update_profanity_filter(ctx, word_boundary=mode == "boundary") is not None:
+            await ctx.send(f"✅ Profanity match mode set to `{mode}`.")
+    
+    @words_group.command(name="leetspeak")
+    async def words_leetspeak(self, ctx, enabled: bool):
+        """Also catch leetspeak spellings such as `h3ll0`"""
+        if await self.update_profanity_filter(ctx, leetspeak=enabled) is not None:
+            await ctx.send(f"✅ Leetspeak normalization {'enabled' if enabled else 'disabled'}.")
+    
+    @automod_group.command(name="spam")
+    async def automod_spam(self, ctx, messages: int, seconds: int):
+        """Set how many messages within how many seconds count as spam"""
+        if not await self.is_owner_or_extra(ctx.guild, ctx.author):
+            await ctx.send("❌ Only server owners and extra owners can configure AutoMod.")
+            return
+        
+        if not 2 <= messages <= 50 or not 1 <= seconds <= 120:
+            await ctx.send("Use 2-50 messages within 1-120 seconds.")
+            return
+        
+        config = await self.bot.db.get_automod_rule(ctx.guild.id, "spam_filter") or {"enabled": True}
+        config.update({"threshold": messages, "window": seconds})
+        await self.bot.db.set_automod_rule(ctx.guild.id, "spam_filter", config)
+        await ctx.send(f"✅ Spam filter now triggers at **{messages}** messages in **{seconds}** seconds.")
+    
+    @automod_group.command(name="duplicates")
+    async def automod_duplicates(self, ctx, channels: str, users: int = 4, seconds: int = 30):
+        """Flag the same message posted in this many channels or by this many users within a time span
+        
+        Opt-in and off by default, since several people posting a common phrase
+        would otherwise be deleted. Use `on`/`off`, or give the thresholds.
+        """
+        if not await self.is_owner_or_extra(ctx.guild, ctx.author):
+            await ctx.send("❌ Only server owners and extra owners can configure AutoMod.")
+            return
+        
+        config = await self.bot.db.get_automod_rule(ctx.guild.id, "duplicate_filter") or {}
+        if channels.lower() in ("on", "off"):
+            config["enabled"] = channels.lower() == "on"
+            await self.bot.db.set_automod_rule(ctx.guild.id, "duplicate_filter", config)
+            await ctx.send(f"✅ Duplicate filter {'enabled' if config['enabled'] else 'disabled'}.")
+            return
+        
+        if not channels.isdigit():
+            await ctx.send("Usage: `automod duplicates <on|off>` or `automod duplicates <channels> <users> <seconds>`")
+            return
+        channels = int(channels)
+        if not 2 <= channels <= 20 or not 2 <= users <= 20 or not 5 <= seconds <= 300:
+            await ctx.send("Use 2-20 channels, 2-20 users and 5-300 seconds.")
+            return
+        
+        config.update({"enabled": True, "channels": channels, "users": users, "window": seconds})
+        await self.bot.db.set_automod_rule(ctx.guild.id, "duplicate_filter", config)
+        await ctx.send(f"✅ Duplicate filter now triggers at **{channels}** channels or **{users}** users within **{seconds}** seconds.")
+    
     @commands.Cog.listener()
     async def on_member_join(self, member):
         """Check new members for suspicious activity"""
@@ -1,6 +1,8 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
+from utils.text_matcher import AhoCorasick, PrefixTrie, regex_problem
+from utils.regex_runner import RegexRunner, RegexTimeout
 
 class TitleModal(discord.ui.Modal, title="Set Embed Title"):
     def __init__(self, view):
@@ -109,6 +111,16 @@ class EmbedSetupView(discord.ui.View):
         property_type = select.values[0]
         
         if property_type == "save":
+            problem = regex_problem(self.trigger.lower()) if self.pattern.lower() == "regex" else None
+            if problem:
+                embed = discord.Embed(
+                    title="❌ Unsafe Regex",
+                    description=f"**Trigger:** `{self.trigger}`\n\nThis pattern can't be saved: {problem}.\nRegex triggers run on every message, so patterns that can backtrack badly are refused.",
+                    color=0xff0000
+                )
+                await interaction.response.edit_message(embed=embed, view=self)
+                return
+            
             # Save autoresponder to database
             autoresponder_config = {
                 "pattern": self.pattern.lower(),
@@ -297,55 +309,115 @@ class AutoresponderListView(discord.ui.View):
         embed = self.get_embed()
         await interaction.response.edit_message(embed=embed, view=self)
 
+class AutoresponderIndex:
+    """Compiled triggers for one guild, built once per autoresponder change"""
+    
+    def __init__(self, autoresponders):
+        self.source = autoresponders
+        self.order = {}  # trigger -> position, so the first configured trigger still wins
+        self.exact = {}
+        self.starts_with = PrefixTrie()
+        self.contains = AhoCorasick()
+        self.regexes = []  # triggers in configured order, each one checked by regex_problem
+        self.disabled = set()
+        self.prefilter = True  # cleared once the combined alternation has timed out
+        
+        for position, (trigger, config) in enumerate(autoresponders.items()):
+            self.order[trigger] = position
+            pattern = config.get("pattern")
+            if pattern == "exact":
+                self.exact.setdefault(trigger, trigger)
+            elif pattern == "starts with":
+                self.starts_with.add(trigger, trigger)
+            elif pattern == "contains":
+                self.contains.add(trigger)
+            elif pattern == "regex":
+                # Saved before patterns were validated; never run an unsafe one
+                problem = regex_problem(trigger)
+                if problem:
+                    print(f"⚠️ Skipping autoresponder regex {trigger!r}: {problem}")
+                else:
+                    self.regexes.append(trigger)
+    
+    async def _match_regex(self, content, runner):
+        active = [trigger for trigger in self.regexes if trigger not in self.disabled]
+        try:
+            index = await runner.search(active, content, prefilter=self.prefilter)
+        except RegexTimeout as e:
+            # Turn off the slow pattern so later messages stay fast
+            if e.index is not None:
+                self.disabled.add(active[e.index])
+                print(f"⚠️ Disabled slow autoresponder regex: {active[e.index]}")
+            else:
+                # The alternation itself was slow; search one by one so the culprit shows up
+                self.prefilter = False
+                print(f"⚠️ Autoresponder regexes timed out together; checking {len(active)} patterns one by one")
+            return None
+        return active[index] if index is not None else None
+    
+    async def match(self, content, runner):
+        """Return the first configured trigger that matches the lowercased content"""
+        candidates = []
+        
+        trigger = self.exact.get(content)
+        if trigger is not None:
+            candidates.append(trigger)
+        candidates.extend(self.starts_with.prefixes_of(content))
+        candidates.extend(pattern for _, _, pattern in self.contains.finditer(content))
+        
+        # Regexes are the slow path; skip them if an earlier trigger already wins
+        best = min(candidates, key=self.order.__getitem__) if candidates else None
+        if self.regexes and (best is None or any(self.order[t] < self.order[best] for t in self.regexes)):
+            trigger = await self._match_regex(content, runner)
+            if trigger is not None and (best is None or self.order[trigger] < self.order[best]):
+                best = trigger
+        return best
+
 class AutoResponder(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.indexes = {}  # guild_id -> AutoresponderIndex
+        self.regex_runner = RegexRunner()
+    
+    def get_index(self, guild_id, autoresponders):
+        index = self.indexes.get(guild_id)
+        # The guild snapshot swaps in a new dict on every change, so identity means up to date
+        if index is None or index.source is not autoresponders:
+            index = AutoresponderIndex(autoresponders)
+            self.indexes[guild_id] = index
+        return index
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
+    async def cog_load(self):
+        self.bot.message_pipeline.register("autoresponder", self.handle_message, concurrent=True)
+    
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("autoresponder")
+        self.regex_runner.close()
+    
+    async def handle_message(self, ctx):
+        message = ctx.message
+        autoresponders = ctx.config.autoresponders
+        if not autoresponders:
             return
         
-        if not message.guild:
+        trigger = await self.get_index(message.guild.id, autoresponders).match(ctx.content_lower, self.regex_runner)
+        if trigger is None:
             return
         
-        autoresponders = await self.bot.db.get_autoresponders(message.guild.id)
+        config = autoresponders[trigger]
+        embed = discord.Embed(
+            title=config["title"],
+            description=config["description"],
+            color=int(config["color"].replace("#", ""), 16)
+        )
         
-        for trigger, config in autoresponders.items():
-            pattern = config["pattern"]
-            message_content = message.content.lower()
-            
-            should_respond = False
-            
-            if pattern == "exact" and message_content == trigger:
-                should_respond = True
-            elif pattern == "starts with" and message_content.startswith(trigger):
-                should_respond = True
-            elif pattern == "contains" and trigger in message_content:
-                should_respond = True
-            elif pattern == "regex":
-                import re
-                try:
-                    if re.search(trigger, message_content):
-                        should_respond = True
-                except:
-                    pass
-            
-            if should_respond:
-                embed = discord.Embed(
-                    title=config["title"],
-                    description=config["description"],
-                    color=int(config["color"].replace("#", ""), 16)
-                )
-                
-                if config.get("author"):
-                    embed.set_author(name=config["author"])
-                
-                if config.get("thumbnail"):
-                    embed.set_thumbnail(url=config["thumbnail"])
-                
-                await message.channel.send(embed=embed)
-                break
+        if config.get("author"):
+            embed.set_author(name=config["author"])
+        
+        if config.get("thumbnail"):
+            embed.set_thumbnail(url=config["thumbnail"])
+        
+        await message.channel.send(embed=embed)
     
     @commands.hybrid_group(name="autoresponder")
     async def autoresponder_group(self, ctx):
@@ -40,23 +40,12 @@ class AutoRule(commands.Cog):
         if user_id == guild.owner_id:
             return True
         
-        # Check extra owners
+        # Extra owners and antinuke whitelist come from the cached guild snapshot
         try:
-            extra_owners = await self.bot.db.get_extra_owners(guild_id)
-            if user_id in extra_owners:
-                return True
+            config = await self.bot.db.get_guild_config(guild_id)
+            return config.is_whitelisted(user_id)
         except:
-            pass
-        
-        # Check antinuke whitelist
-        try:
-            antinuke_whitelist = await self.bot.db.get_antinuke_rule(guild_id, "whitelist")
-            if antinuke_whitelist and user_id in antinuke_whitelist.get("users", []):
-                return True
-        except:
-            pass
-        
-        return False
+            return False
     
     async def notify_owner(self, guild, action, user, details):
         """Send DM to server owner about rule violations"""
@@ -218,22 +207,29 @@ class AutoRule(commands.Cog):
         
         await ctx.send(embed=embed)
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def cog_load(self):
+        self.bot.message_pipeline.register("autorule", self.handle_message, priority=20)
+    
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("autorule")
+    
+    async def notify(self, message, text):
+        """Short-lived warning in the channel, at most one per user every 5 seconds"""
+        if self.bot.cooldowns.trigger(("autorule", message.guild.id, message.author.id), 5):
+            await message.channel.send(text, delete_after=5)
+    
+    async def handle_message(self, ctx):
         """Enhanced message rule checking"""
-        if message.author.bot or not message.guild:
-            return
+        message = ctx.message
+        config = ctx.config
         
         # Check if AutoRule is enabled
-        try:
-            enabled = await self.bot.db.get_autorule_rule(message.guild.id, "enabled")
-            if not enabled or not enabled.get("status"):
-                return
-        except:
+        enabled = config.autorule.get("enabled")
+        if not enabled or not enabled.get("status"):
             return
         
         # Check if user is whitelisted
-        if await self.is_whitelisted(message.guild.id, message.author.id):
+        if ctx.is_whitelisted:
             return
         
         deleted = False
@@ -241,13 +237,13 @@ class AutoRule(commands.Cog):
         
         # Mass mention check
         try:
-            rule = await self.bot.db.get_autorule_rule(message.guild.id, "no_mass_mention")
+            rule = config.autorule.get("no_mass_mention")
             if rule and rule.get("enabled"):
                 mention_count = len(message.mentions) + len(message.role_mentions)
                 if mention_count >= rule.get("limit", 5):
                     try:
                         await message.delete()
-                        await message.channel.send(f"👥 {message.author.mention}, no mass mentions allowed!", delete_after=5)
+                        await self.notify(message, f"👥 {message.author.mention}, no mass mentions allowed!")
                         deleted = True
                         violation_type = "Mass Mentions"
                         
@@ -261,12 +257,12 @@ class AutoRule(commands.Cog):
         # Invite links check
         if not deleted:
             try:
-                rule = await self.bot.db.get_autorule_rule(message.guild.id, "no_invite_links")
+                rule = config.autorule.get("no_invite_links")
                 if rule and rule.get("enabled"):
                     if re.search(r'discord\.gg/|discord\.com/invite/|discordapp\.com/invite/', message.content):
                         try:
                             await message.delete()
-                            await message.channel.send(f"🔗 {message.author.mention}, invite links are not allowed!", delete_after=5)
+                            await self.notify(message, f"🔗 {message.author.mention}, invite links are not allowed!")
                             deleted = True
                             violation_type = "Invite Links"
                         except:
@@ -277,12 +273,12 @@ class AutoRule(commands.Cog):
         # External links check
         if not deleted:
             try:
-                rule = await self.bot.db.get_autorule_rule(message.guild.id, "no_external_links")
+                rule = config.autorule.get("no_external_links")
                 if rule and rule.get("enabled"):
                     if re.search(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', message.content):
                         try:
                             await message.delete()
-                            await message.channel.send(f"🌐 {message.author.mention}, external links are not allowed!", delete_after=5)
+                            await self.notify(message, f"🌐 {message.author.mention}, external links are not allowed!")
                             deleted = True
                             violation_type = "External Links"
                         except:
@@ -293,7 +289,7 @@ class AutoRule(commands.Cog):
         # Repeated text check
         if not deleted:
             try:
-                rule = await self.bot.db.get_autorule_rule(message.guild.id, "no_repeated_text")
+                rule = config.autorule.get("no_repeated_text")
                 if rule and rule.get("enabled"):
                     words = message.content.split()
                     if len(words) > 1:
@@ -301,7 +297,7 @@ class AutoRule(commands.Cog):
                         if repeated_count >= rule.get("limit", 3):
                             try:
                                 await message.delete()
-                                await message.channel.send(f"🔄 {message.author.mention}, no repeated text allowed!", delete_after=5)
+                                await self.notify(message, f"🔄 {message.author.mention}, no repeated text allowed!")
                                 deleted = True
                                 violation_type = "Repeated Text"
                             except:
@@ -312,13 +308,13 @@ class AutoRule(commands.Cog):
         # Emoji spam check
         if not deleted:
             try:
-                rule = await self.bot.db.get_autorule_rule(message.guild.id, "no_emoji_spam")
+                rule = config.autorule.get("no_emoji_spam")
                 if rule and rule.get("enabled"):
                     emoji_count = len(re.findall(r'<:[^:]+:\d+>|[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', message.content))
                     if emoji_count >= rule.get("limit", 10):
                         try:
                             await message.delete()
-                            await message.channel.send(f"😀 {message.author.mention}, too many emojis!", delete_after=5)
+                            await self.notify(message, f"😀 {message.author.mention}, too many emojis!")
                             deleted = True
                             violation_type = "Emoji Spam"
                         except:
@@ -328,6 +324,7 @@ class AutoRule(commands.Cog):
         
         # Log violation and notify owner
         if deleted:
+            ctx.mark_deleted("autorule")
             await self.log_action(message.guild, violation_type, message.author, f"Message deleted: {message.content[:100]}...")
             await self.notify_owner(message.guild, violation_type, message.author, f"Violated {violation_type.lower()} rule")
     
@@ -4,14 +4,13 @@ import re
 import random
 import time
 from utils.embed_utils import add_dravon_footer
-try:
-    from PIL import Image, ImageDraw, ImageFont, ImageFilter
-    import aiohttp
-    import io
-    import math
-    CANVA_AVAILABLE = True
-except ImportError:
-    CANVA_AVAILABLE = False
+import io
+from utils.card_renderer import CardRenderService, RenderQueueFull, PIL_AVAILABLE
+from utils.image_cache import ImageCache, asset_key, AIOHTTP_AVAILABLE
+
+# Cards are drawn in the renderer's worker processes; this cog only needs to know they can be
+CANVA_AVAILABLE = PIL_AVAILABLE and AIOHTTP_AVAILABLE
+if not CANVA_AVAILABLE:
     print("⚠️ PIL not installed. Canvacard features disabled.")
 
 class CanvaSetupView(discord.ui.View):
@@ -150,12 +149,7 @@ class TestLevelUpView(discord.ui.View):
             new_xp = ((new_level - 1) ** 2) * 100
             
             # Get user rank
-            leaderboard = await interaction.client.db.get_leaderboard(self.guild_id, 0)
-            user_rank = 1
-            for i, user_entry in enumerate(leaderboard):
-                if user_entry.get("user_id") == self.user.id:
-                    user_rank = i + 1
-                    break
+            user_rank = await interaction.client.db.get_user_rank(self.guild_id, self.user.id) or 1
             
             # Update database
             await interaction.client.db.set_user_xp(self.guild_id, self.user.id, new_xp, new_level)
@@ -202,12 +196,7 @@ class TestLevelUpView(discord.ui.View):
             new_xp = ((new_level - 1) ** 2) * 100
             
             # Get user rank
-            leaderboard = await interaction.client.db.get_leaderboard(self.guild_id, 0)
-            user_rank = 1
-            for i, user_entry in enumerate(leaderboard):
-                if user_entry.get("user_id") == self.user.id:
-                    user_rank = i + 1
-                    break
+            user_rank = await interaction.client.db.get_user_rank(self.guild_id, self.user.id) or 1
             
             # Update database
             await interaction.client.db.set_user_xp(self.guild_id, self.user.id, new_xp, new_level)
@@ -527,10 +516,15 @@ class LeaderboardView(discord.ui.View):
         embed = add_dravon_footer(embed)
         return embed
 
+# Banners are only known through a REST user fetch; recheck this often
+BANNER_TTL = 1800
+
 class LevelUp(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.user_cooldowns = {}
+        self.renderer = CardRenderService()
+        self.images = ImageCache()
+        self.banners = {}  # user_id -> (banner asset or None, fetched at)
     
     def calculate_level(self, xp):
         """Calculate level from XP"""
@@ -557,225 +551,86 @@ class LevelUp(commands.Cog):
         
         return text
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot or not message.guild:
-            return
+    async def cog_load(self):
+        self.bot.message_pipeline.register("levelup", self.handle_message, concurrent=True)
+    
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("levelup")
+        await self.renderer.close()
+        await self.images.close()
+    
+    async def handle_message(self, ctx):
+        message = ctx.message
         
         # Cooldown check (60 seconds)
-        user_key = f"{message.guild.id}_{message.author.id}"
-        current_time = time.time()
-        
-        if user_key in self.user_cooldowns:
-            if current_time - self.user_cooldowns[user_key] < 60:
-                return
-        
-        self.user_cooldowns[user_key] = current_time
+        if not self.bot.cooldowns.trigger(("levelup", message.guild.id, message.author.id), 60):
+            return
         
-        # Add XP (15-25 per message)
+        # Add XP (15-25 per message); applied in memory and written behind
         xp_gain = random.randint(15, 25)
-        user_data = await self.bot.db.get_user_xp(message.guild.id, message.author.id)
-        
-        if not user_data:
-            new_xp = xp_gain
-            old_level = 1
-        else:
-            new_xp = user_data.get("xp", 0) + xp_gain
-            old_level = user_data.get("level", 1)
-        
-        new_level = self.calculate_level(new_xp)
-        
-        # Update database with rank calculation
-        await self.bot.db.set_user_xp(message.guild.id, message.author.id, new_xp, new_level)
+        old_level, new_xp, new_level = await self.bot.db.add_user_xp(
+            message.guild.id, message.author.id, xp_gain, self.calculate_level
+        )
         
         # Check if user leveled up
         if new_level > old_level:
             # Get user's rank in the server
-            leaderboard = await self.bot.db.get_leaderboard(message.guild.id, 0)
-            user_rank = 1
-            for i, user_entry in enumerate(leaderboard):
-                if user_entry.get("user_id") == message.author.id:
-                    user_rank = i + 1
-                    break
+            user_rank = await self.bot.db.get_user_rank(message.guild.id, message.author.id) or 1
             
             await self.send_levelup_message(message, new_level, new_xp, user_rank)
     
-    async def create_canva_card(self, user, level, xp, rank=1):
-        """Create a Canvacard using Python PIL"""
+    async def get_banner(self, user):
+        """The user's banner asset or None, looked up at most every BANNER_TTL seconds"""
+        now = time.monotonic()
+        cached = self.banners.get(user.id)
+        if cached and now - cached[1] < BANNER_TTL:
+            return cached[0]
+        
+        try:
+            banner = (await self.bot.fetch_user(user.id)).banner
+        except discord.HTTPException:
+            banner = cached[0] if cached else None
+        
+        if len(self.banners) > 5000:
+            self.banners = {user_id: entry for user_id, entry in self.banners.items() if now - entry[1] < BANNER_TTL}
+        self.banners[user.id] = (banner, now)
+        return banner
+    
+    async def create_canva_card(self, user, level, xp, rank=1, priority=0):
+        """Create a Canvacard; the PIL work runs in the render process pool"""
         if not CANVA_AVAILABLE:
             return None
             
         try:
-            WIDTH, HEIGHT = 800, 350
-            
-            # Get user banner or avatar for background
-            background_url = None
+            # Banner if the user has one, otherwise the avatar, blurred behind the card
+            background = await self.get_banner(user) or user.display_avatar
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(f'https://discord.com/api/v10/users/{user.id}', 
-                                         headers={'Authorization': f'Bot {self.bot.token}'}) as resp:
-                        if resp.status == 200:
-                            user_data = await resp.json()
-                            if user_data.get('banner'):
-                                background_url = f"https://cdn.discordapp.com/banners/{user.id}/{user_data['banner']}.png?size=1024"
+                background_bytes = await self.images.get_asset(background, 512)
             except:
-                pass
-            
-            # If no banner, use avatar
-            if not background_url:
-                background_url = str(user.display_avatar.with_size(1024).url)
+                background_bytes = None  # renderer falls back to a gradient
             
-            # Create base image
-            img = Image.new('RGBA', (WIDTH, HEIGHT), (0, 0, 0, 0))
-            
-            # Create blurred background
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(background_url) as resp:
-                        bg_bytes = await resp.read()
-                
-                bg_img = Image.open(io.BytesIO(bg_bytes)).convert('RGBA')
-                bg_ratio = max(WIDTH / bg_img.width, HEIGHT / bg_img.height)
-                new_width = int(bg_img.width * bg_ratio)
-                new_height = int(bg_img.height * bg_ratio)
-                bg_img = bg_img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                
-                left = (new_width - WIDTH) // 2
-                top = (new_height - HEIGHT) // 2
-                bg_img = bg_img.crop((left, top, left + WIDTH, top + HEIGHT))
-                bg_img = bg_img.filter(ImageFilter.GaussianBlur(radius=8))
-                
-                img.paste(bg_img, (0, 0))
-                
-                # Dark overlay
-                overlay = Image.new('RGBA', (WIDTH, HEIGHT), (0, 0, 0, 150))
-                img = Image.alpha_composite(img, overlay)
-                
-            except:
-                # Fallback gradient
-                for y in range(HEIGHT):
-                    r = int(35 + (y / HEIGHT) * 20)
-                    g = int(39 + (y / HEIGHT) * 25) 
-                    b = int(42 + (y / HEIGHT) * 30)
-                    for x in range(WIDTH):
-                        img.putpixel((x, y), (r, g, b, 255))
-            
-            draw = ImageDraw.Draw(img)
-            
-            # Get fonts
-            try:
-                font_name = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 32)
-                font_info = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 18)
-                font_small = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14)
-                font_time = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 12)
-            except:
-                font_name = font_info = font_small = font_time = ImageFont.load_default()
-            
-            # Get user avatar
-            async with aiohttp.ClientSession() as session:
-                async with session.get(str(user.display_avatar.with_size(256).url)) as resp:
-                    avatar_bytes = await resp.read()
-            
-            # Process avatar
-            avatar = Image.open(io.BytesIO(avatar_bytes)).convert('RGBA')
-            avatar = avatar.resize((140, 140), Image.Resampling.LANCZOS)
-            
-            # Circular mask
-            mask = Image.new('L', (140, 140), 0)
-            mask_draw = ImageDraw.Draw(mask)
-            mask_draw.ellipse((0, 0, 140, 140), fill=255)
-            avatar.putalpha(mask)
-            
-            # Paste avatar
-            img.paste(avatar, (30, 71), avatar)
-            
-            # User status indicator
-            status_colors = {
-                'online': (67, 181, 129),
-                'idle': (250, 166, 26), 
-                'dnd': (240, 71, 71),
-                'offline': (116, 127, 141)
-            }
-            status = getattr(user, 'status', 'offline')
-            status_color = status_colors.get(str(status), status_colors['offline'])
-            draw.ellipse((155, 195, 175, 215), fill=status_color, outline=(255, 255, 255), width=4)
+            avatar_bytes = await self.images.get_asset(user.display_avatar, 256)
+            if avatar_bytes is None:
+                return None
             
-            # Username
-            username = user.display_name or user.name
-            if len(username) > 20:
-                username = username[:17] + "..."
-            draw.text((200, 75), username, fill=(255, 255, 255), font=font_name)
-            
-            # XP Progress bar
-            xp_needed = 100 + level * 25
-            percent = min(xp / xp_needed, 1)
-            
-            bar_x, bar_y = 200, 150
-            bar_width, bar_height = 550, 32
-            
-            # Progress bar background
-            draw.rounded_rectangle([(bar_x, bar_y), (bar_x + bar_width, bar_y + bar_height)],
-                                 radius=16, fill=(50, 50, 50, 200))
-            
-            # Green progress fill
-            progress_width = int(bar_width * percent)
-            if progress_width > 16:
-                for i in range(progress_width):
-                    ratio = i / bar_width
-                    r = int(34 + ratio * 20)    # Green gradient
-                    g = int(197 - ratio * 30)   
-                    b = int(94 + ratio * 20)    
-                    
-                    draw.rectangle([(bar_x + i, bar_y + 3), (bar_x + i + 1, bar_y + bar_height - 3)],
-                                 fill=(r, g, b, 255))
-            
-            # XP and Rank info boxes
-            info_box_width = 120
-            info_box_height = 25
-            info_x = WIDTH - info_box_width - 15
-            info_y = HEIGHT - info_box_height - 50
-            
-            # XP box
-            draw.rounded_rectangle([(info_x, info_y), (info_x + info_box_width, info_y + info_box_height)],
-                                 radius=12, fill=(0, 0, 0, 120))
-            
-            xp_text = f"{xp} / {xp_needed} XP"
-            xp_bbox = draw.textbbox((0, 0), xp_text, font=font_small)
-            xp_text_x = info_x + (info_box_width - (xp_bbox[2] - xp_bbox[0])) // 2
-            draw.text((xp_text_x, info_y + 6), xp_text, fill=(255, 255, 255), font=font_small)
-            
-            # Rank box
-            rank_y = info_y - 35
-            draw.rounded_rectangle([(info_x, rank_y), (info_x + info_box_width, rank_y + info_box_height)],
-                                 radius=12, fill=(0, 0, 0, 120))
-            
-            rank_text = f"RANK #{rank} • LVL {level}"
-            rank_bbox = draw.textbbox((0, 0), rank_text, font=font_small)
-            rank_text_x = info_x + (info_box_width - (rank_bbox[2] - rank_bbox[0])) // 2
-            draw.text((rank_text_x, rank_y + 6), rank_text, fill=(255, 255, 255), font=font_small)
-            
-            # Time box
             from datetime import datetime
-            current_time = datetime.now().strftime("%I:%M %p")
-            
-            time_box_width = 80
-            time_box_height = 25
-            time_x = WIDTH - time_box_width - 15
-            time_y = HEIGHT - time_box_height - 15
-            
-            draw.rounded_rectangle([(time_x, time_y), (time_x + time_box_width, time_y + time_box_height)],
-                                 radius=12, fill=(0, 0, 0, 120))
-            
-            time_bbox = draw.textbbox((0, 0), current_time, font=font_time)
-            time_text_x = time_x + (time_box_width - (time_bbox[2] - time_bbox[0])) // 2
-            draw.text((time_text_x, time_y + 6), current_time, fill=(255, 255, 255), font=font_time)
-            
-            # Convert to bytes
-            buffer = io.BytesIO()
-            img.save(buffer, format='PNG')
-            buffer.seek(0)
-            return buffer.getvalue()
+            spec = {
+                "background": background_bytes,
+                "background_key": asset_key(background, 512),
+                "avatar": avatar_bytes,
+                "avatar_key": asset_key(user.display_avatar, 256),
+                "username": user.display_name or user.name,
+                "status": str(getattr(user, 'status', 'offline')),
+                "level": level,
+                "xp": xp,
+                "rank": rank,
+                "time": datetime.now().strftime("%I:%M %p")
+            }
+            return await self.renderer.render(spec, priority)
             
+        except RenderQueueFull:
+            print("⚠️ Rank card queue full; sending a plain level-up embed instead")
+            return None
         except Exception as e:
             print(f"Error creating canva card: {e}")
             import traceback
@@ -805,7 +660,8 @@ class LevelUp(commands.Cog):
         
         if use_canva and CANVA_AVAILABLE:
             # Create and send canva card with full tracking
-            card_bytes = await self.create_canva_card(message.author, level, xp, rank)
+            # Announcements queue behind cards someone explicitly asked for
+            card_bytes = await self.create_canva_card(message.author, level, xp, rank, priority=1)
             if card_bytes:
                 file = discord.File(io.BytesIO(card_bytes), filename="levelup.png")
                 # Send congratulations message in chat format
@@ -1039,6 +895,39 @@ class LevelUp(commands.Cog):
         
         view = TestLevelUpView(self.bot, ctx.guild.id, ctx.author)
         await ctx.send(embed=embed, view=view)
+    
+    @levelup_group.command(name="cardstats")
+    async def levelup_cardstats(self, ctx):
+        """Show rank card renderer queue and timing metrics"""
+        if not ctx.author.guild_permissions.manage_guild:
+            await ctx.send("You need 'Manage Server' permission to use this command.")
+            return
+        
+        stats = self.renderer.stats()
+        embed = discord.Embed(title="🎨 Card Renderer", color=0x7289da)
+        embed.add_field(
+            name="📥 Queue",
+            value=f"**Depth:** {stats['queue_depth']}\n**Rendering:** {stats['in_flight']}\n**Wait p95:** {stats['wait_p95_ms']:.0f}ms",
+            inline=True
+        )
+        embed.add_field(
+            name="⏱️ Render Time",
+            value=f"**p50:** {stats['render_p50_ms']:.0f}ms\n**p95:** {stats['render_p95_ms']:.0f}ms",
+            inline=True
+        )
+        embed.add_field(
+            name="📊 Totals",
+            value=f"**Rendered:** {stats['rendered']}\n**Cache Hits:** {stats['cache_hits']}\n**Failed:** {stats['failed']}\n**Rejected:** {stats['rejected']}",
+            inline=True
+        )
+        images = self.images.stats
+        embed.add_field(
+            name="🖼️ Image Cache",
+            value=f"**Memory:** {images['memory']}\n**Disk:** {images['disk']}\n**Downloaded:** {images['network']}",
+            inline=True
+        )
+        embed = add_dravon_footer(embed)
+        await ctx.send(embed=embed)
 
 async def setup(bot):
     await bot.add_cog(LevelUp(bot))
\ No newline at end of file
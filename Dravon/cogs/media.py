@@ -144,10 +144,14 @@ class Media(commands.Cog):
         embed.set_thumbnail(url=self.bot.user.display_avatar.url)
         await ctx.send(embed=embed)
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot or not message.guild:
-            return
+    async def cog_load(self):
+        self.bot.message_pipeline.register("media", self.handle_message, priority=30)
+    
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("media")
+    
+    async def handle_message(self, ctx):
+        message = ctx.message
         
         # Only filter in designated media channels
         if (message.guild.id in self.media_channels and 
@@ -163,6 +167,7 @@ class Media(commands.Cog):
             if not message.attachments and not message.embeds:
                 try:
                     await message.delete()
+                    ctx.mark_deleted("media")
                     await message.channel.send(f"{message.author.mention}, this channel is for media only!", delete_after=3)
                 except:
                     pass
@@ -23,10 +23,14 @@ class Mention(commands.Cog):
             "📈 Want to boost engagement? My level system with custom rewards will keep your members active!"
         ]
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        if message.author.bot:
-            return
+    async def cog_load(self):
+        self.bot.message_pipeline.register("mention", self.handle_message, concurrent=True, guild_only=False)
+    
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("mention")
+    
+    async def handle_message(self, ctx):
+        message = ctx.message
         
         if self.bot.user.mentioned_in(message) and not message.mention_everyone:
             response = random.choice(self.responses)
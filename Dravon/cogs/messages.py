@@ -169,14 +169,16 @@ class Messages(commands.Cog):
         embed = await view.create_embed(0)
         await ctx.send(embed=embed, view=view)
     
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def cog_load(self):
+        self.bot.message_pipeline.register("messages", self.handle_message, concurrent=True)
+    
+    async def cog_unload(self):
+        self.bot.message_pipeline.unregister("messages")
+    
+    async def handle_message(self, ctx):
         """Track user messages"""
-        if message.author.bot or not message.guild:
-            return
-        
         try:
-            await self.bot.db.increment_user_messages(message.guild.id, message.author.id)
+            await self.bot.db.increment_user_messages(ctx.guild.id, ctx.author.id)
         except:
             pass
     
@@ -54,6 +54,10 @@ class Premium(commands.Cog):
     
     async def is_premium(self, user_id: int) -> bool:
         """Check if user has active premium"""
+        active = self.bot.db.premium.user_active(user_id)
+        if active is not None:
+            return active
+        
         premium_data = await self.bot.db.get_premium_user(user_id)
         if not premium_data:
             return False
@@ -327,6 +331,10 @@ class Premium(commands.Cog):
     
     async def is_premium_guild(self, guild_id: int) -> bool:
         """Check if guild has premium activated"""
+        active = self.bot.db.premium.guild_active(guild_id)
+        if active is not None:
+            return active
+        
         guild_data = await self.bot.db.get_premium_guild(guild_id)
         if not guild_data:
             return False
@@ -60,6 +60,7 @@ class StatsView(discord.ui.View):
         used_memory = round(memory.used / (1024**3), 2)
         free_memory = round(memory.available / (1024**3), 2)
         process_memory = round(process.memory_info().rss / (1024**2), 2)
+        cooldowns = self.bot.cooldowns.stats()
         
         description = f"""__**System Information**__
 > **OS**: `{platform.system()} {platform.release()}`
@@ -71,7 +72,8 @@ class StatsView(discord.ui.View):
 > **Used Memory**: `{used_memory}GB`
 > **Free Memory**: `{free_memory}GB`
 > **Process Memory**: `{process_memory}MB`
-> **Heap Used**: `{process_memory}MB`"""
+> **Heap Used**: `{process_memory}MB`
+> **Cooldowns**: `{cooldowns['keys']:,} active` (`{cooldowns['expired']:,} expired`)"""
         
         embed.description = description
         await interaction.response.edit_message(embed=embed, view=self)
@@ -3,10 +3,49 @@ from discord.ext import commands
 import asyncio
 import os
 from config import TOKEN
-from utils.database import Database
+from utils.database import Database, GuildConfig
 from utils.emoji import EmojiHandler
+from utils.message_pipeline import MessageContext, MessagePipeline
+from utils.rate_tracker import CooldownMap
+from utils.command_index import CommandIndex
 from datetime import datetime
 import time
+from collections import deque
+
+# Always rewritten by the premium no-prefix system, even if their cog failed to load
+NO_PREFIX_STATIC_COMMANDS = {
+    'help', 'serverinfo', 'si', 'userinfo', 'ui', 'botinfo', 'bi',
+    'ping', 'play', 'p', 'skip', 'stop', 'pause', 'resume', 'queue',
+    'ban', 'kick', 'mute', 'unmute', 'purge', 'antinuke', 'automod',
+    'ticket', 'premium', 'voicepanel', 'vp', 'musicpanel', 'mp'
+}
+
+# Synonyms that edit distance can't find; suggest() only uses those whose target is registered
+SUGGESTION_HINTS = {
+    'h': 'help', 'commands': 'help', 'cmd': 'help', 'command': 'help', 'cmds': 'help',
+    'server': 'serverinfo', 'guild': 'serverinfo', 'sinfo': 'serverinfo', 'guildinfo': 'serverinfo', 'serverstats': 'serverinfo',
+    'user': 'userinfo', 'uinfo': 'userinfo', 'whois': 'userinfo', 'info': 'userinfo',
+    'bot': 'botinfo', 'binfo': 'botinfo', 'about': 'botinfo', 'stats': 'botinfo',
+    'music': 'play', 'song': 'play', 'mp3': 'play', 'youtube': 'play', 'yt': 'play', 'spotify': 'play',
+    'prem': 'premium', 'vip': 'premium', 'pro': 'premium', 'upgrade': 'premium',
+    'anti': 'antinuke', 'security': 'antinuke', 'protection': 'antinuke', 'nuke': 'antinuke', 'secure': 'antinuke', 'safety': 'antinuke',
+    'auto': 'automod', 'mod': 'automod', 'moderation': 'automod', 'amod': 'automod', 'filter': 'automod', 'automoderation': 'automod',
+    'invite': 'invites', 'inv': 'invites', 'invs': 'invites', 'invitations': 'invites',
+    'latency': 'ping', 'pong': 'ping', 'lag': 'ping', 'ms': 'ping', 'speed': 'ping',
+    'remove': 'kick', 'boot': 'kick', 'eject': 'kick',
+    'banish': 'ban', 'block': 'ban', 'hammer': 'ban',
+    'timeout': 'mute', 'silence': 'mute', 'quiet': 'mute', 'shush': 'mute',
+    'warning': 'warn', 'caution': 'warn', 'alert': 'warn',
+    'clear': 'purge', 'delete': 'purge', 'clean': 'purge', 'prune': 'purge',
+    'voice': 'voicepanel', 'vc': 'voicepanel', 'vpanel': 'voicepanel', 'mpanel': 'musicpanel',
+    'support': 'ticket', 'tickets': 'ticket', 'tkt': 'ticket',
+    'gw': 'giveaway', 'give': 'giveaway', 'contest': 'giveaway', 'raffle': 'giveaway',
+    'announcement': 'embed', 'message': 'embed', 'rich': 'embed',
+    'greet': 'welcome', 'greeting': 'welcome', 'join': 'welcome',
+    'addrole': 'roleadd', 'giverole': 'roleadd', 'role': 'roleadd',
+    'av': 'avatar', 'pfp': 'avatar', 'picture': 'avatar', 'pic': 'avatar',
+    'bn': 'banner', 'cover': 'banner', 'pr': 'profile', 'bio': 'profile'
+}
 
 class DravonBot(commands.Bot):
     def __init__(self):
@@ -21,9 +60,14 @@ class DravonBot(commands.Bot):
             help_command=None
         )
         
-        self.db = Database()
+        # PREFIX_CACHE_SIZE bounds the in-memory prefix map as an LRU (0 = keep every guild)
+        self.db = Database(prefix_cache_size=int(os.getenv('PREFIX_CACHE_SIZE', '0')) or None)
         self.emoji_handler = EmojiHandler()
-        self.cooldowns = {}  # User cooldown tracking
+        self.message_pipeline = MessagePipeline()  # Cogs register their message handlers here
+        self.command_index = CommandIndex(self, static=NO_PREFIX_STATIC_COMMANDS, hints=SUGGESTION_HINTS)  # Rebuilt when cogs change
+        self._processed_commands = deque(maxlen=100)  # Ring buffer of dispatched message ids
+        self._processed_ids = set()  # Same ids, for O(1) lookups
+        self.cooldowns = CooldownMap()  # Shared expiring cooldowns, keyed by (feature, ...) tuples
         self.bot_admin_id = 1037768611126841405  # Main bot admin
         self.bot_admins = {1037768611126841405}  # Set of bot admins
         self.start_time = time.time()  # Bot start time
@@ -32,10 +76,36 @@ class DravonBot(commands.Bot):
         if not message.guild:
             return ">"
         
-        custom_prefix = await self.db.get_prefix(message.guild.id)
+        # Hot path: plain dict hit, only falls back to the database on an LRU miss
+        custom_prefix = self.db.prefixes.get(message.guild.id)
+        if custom_prefix is None:
+            custom_prefix = await self.db.get_prefix(message.guild.id)
         return custom_prefix or ">"
     
+    async def add_cog(self, cog, /, **kwargs):
+        await super().add_cog(cog, **kwargs)
+        self.command_index.invalidate()
+    
+    async def remove_cog(self, name, /, **kwargs):
+        cog = await super().remove_cog(name, **kwargs)
+        self.command_index.invalidate()
+        return cog
+    
     async def setup_hook(self):
+        # Preload guild prefixes so get_prefix never touches the database
+        try:
+            count = await self.db.load_prefixes()
+            print(f"✅ Loaded {count} custom prefixes")
+        except Exception as e:
+            print(f"⚠️ Failed to preload prefixes: {e}")
+        
+        # Premium checks run on every message; keep entitlements in memory
+        try:
+            users, guilds = await self.db.load_premium()
+            print(f"✅ Loaded {users} premium users and {guilds} premium guilds")
+        except Exception as e:
+            print(f"⚠️ Failed to preload premium entitlements: {e}")
+        
         # Load all existing cogs
         cogs = [
             'cogs.welcome', 'cogs.prefix', 'cogs.autoresponder', 'cogs.serverinfo',
@@ -81,6 +151,9 @@ class DravonBot(commands.Bot):
     async def on_guild_remove(self, guild):
         activity = discord.Activity(type=discord.ActivityType.watching, name=f"currently {len(self.guilds)} servers")
         await self.change_presence(activity=activity)
+        
+        # Drop the cached config snapshot for guilds we no longer serve
+        self.db.invalidate_guild_config(guild.id)
     
     async def on_ready(self):
         print("=" * 50)
@@ -119,6 +192,15 @@ class DravonBot(commands.Bot):
                 await self.change_presence(activity=activity)
                 await asyncio.sleep(10)  # Change every 10 seconds
     
+    async def close(self):
+        await super().close()
+        
+        # Release pooled database connections once no more events can arrive
+        try:
+            await self.db.close()
+        except Exception as e:
+            print(f"⚠️ Failed to close database: {e}")
+    
     async def on_message(self, message):
         if message.author.bot:
             return
@@ -128,88 +210,18 @@ class DravonBot(commands.Bot):
         # if botadmin_cog and botadmin_cog.is_blacklisted(message.author.id):
         #     return
         
-        # Enhanced command suggestions
-        if message.guild and message.content.startswith('>'):
-            ctx = await self.get_context(message)
-            if ctx.command is None and len(message.content) > 1:
-                # Extract the attempted command
-                attempted_command = message.content[1:].split()[0].lower()
-                
-                # Expanded command suggestions
-                suggestions = {
-                    'help': ['help', 'h', 'commands', 'cmd', 'command', 'cmds'],
-                    'serverinfo': ['serverinfo', 'si', 'server', 'guild', 'sinfo', 'guildinfo', 'serverstats'],
-                    'userinfo': ['userinfo', 'ui', 'user', 'profile', 'uinfo', 'whois', 'info'],
-                    'botinfo': ['botinfo', 'bi', 'bot', 'info', 'binfo', 'about', 'stats'],
-                    'play': ['play', 'p', 'music', 'song', 'mp3', 'youtube', 'yt', 'spotify'],
-                    'premium': ['premium', 'prem', 'vip', 'pro', 'upgrade'],
-                    'antinuke': ['antinuke', 'anti', 'security', 'protection', 'nuke', 'secure', 'safety'],
-                    'automod': ['automod', 'auto', 'mod', 'moderation', 'amod', 'filter', 'automoderation'],
-                    'invites': ['invites', 'invite', 'inv', 'i', 'invs', 'invitations'],
-                    'ping': ['ping', 'latency', 'pong', 'lag', 'ms', 'speed'],
-                    'kick': ['kick', 'remove', 'boot', 'eject'],
-                    'ban': ['ban', 'banish', 'block', 'hammer'],
-                    'mute': ['mute', 'timeout', 'silence', 'quiet', 'shush'],
-                    'warn': ['warn', 'warning', 'caution', 'alert'],
-                    'purge': ['purge', 'clear', 'delete', 'clean', 'prune'],
-                    'voicepanel': ['voicepanel', 'vp', 'voice', 'vc', 'vpanel'],
-                    'musicpanel': ['musicpanel', 'mp', 'music', 'mpanel'],
-
-                    'ticket': ['ticket', 'support', 'tickets', 'tkt'],
-                    'giveaway': ['giveaway', 'gw', 'give', 'contest', 'raffle'],
-                    'embed': ['embed', 'announcement', 'message', 'rich'],
-                    'welcome': ['welcome', 'greet', 'greeting', 'join'],
-                    'roleadd': ['roleadd', 'addrole', 'giverole', 'role'],
-                    'avatar': ['avatar', 'av', 'pfp', 'picture', 'pic'],
-                    'banner': ['banner', 'bn', 'cover'],
-                    'profile': ['profile', 'pr', 'bio', 'about']
-                }
-                
-                # Find best match with fuzzy matching
-                best_match = None
-                best_score = 0
-                
-                for cmd, aliases in suggestions.items():
-                    for alias in aliases:
-                        # Exact match
-                        if attempted_command == alias:
-                            best_match = cmd
-                            best_score = 100
-                            break
-                        # Starts with match
-                        elif attempted_command.startswith(alias) or alias.startswith(attempted_command):
-                            score = len(attempted_command) / len(alias) * 80
-                            if score > best_score:
-                                best_match = cmd
-                                best_score = score
-                        # Contains match
-                        elif attempted_command in alias or alias in attempted_command:
-                            score = 60
-                            if score > best_score:
-                                best_match = cmd
-                                best_score = score
-                    if best_score == 100:
-                        break
-                
-                if best_match and best_score > 50:
-                    embed = discord.Embed(
-                        title="💡 Command Suggestion",
-                        description=f"Did you mean `>{best_match}`?\n\n*Tip: Use `>help` to see all available commands!*",
-                        color=0x7289da
-                    )
-                    embed.set_thumbnail(url=self.user.display_avatar.url)
-                    embed.set_footer(text="Dravon™ Smart Suggestions", icon_url=self.user.display_avatar.url)
-                    await message.channel.send(embed=embed, delete_after=8)
-                elif len(attempted_command) > 2:
-                    # Show helpful message for unknown commands
-                    embed = discord.Embed(
-                        title="❓ Command Not Found",
-                        description=f"Command `{attempted_command}` not found.\n\n**Quick Help:**\n• Use `>help` to see all commands\n• Try `>botinfo` for bot information\n• Need support? Use `>support`",
-                        color=0xff8c00
-                    )
-                    embed.set_thumbnail(url=self.user.display_avatar.url)
-                    embed.set_footer(text="Need help? Join our support server!", icon_url=self.user.display_avatar.url)
-                    await message.channel.send(embed=embed, delete_after=10)
+        # Run cog message handlers once, sharing one context and config snapshot
+        config = None
+        if message.guild:
+            try:
+                config = await self.db.get_guild_config(message.guild.id)
+            except Exception as e:
+                print(f"⚠️ Failed to load guild config: {e}")
+                config = GuildConfig(message.guild.id)  # Defaults: filters off, trackers still run
+        
+        message_ctx = await self.message_pipeline.dispatch(MessageContext(message, config))
+        if message_ctx.deleted:
+            return
         
         # No-prefix system for PREMIUM users only
         if message.guild and not message.content.startswith(('>', '/', '<@', '!', '?', '.', '-', '+', '=')):
@@ -230,43 +242,26 @@ class DravonBot(commands.Bot):
                 first_word = words[0].lower()
                 
                 if first_word and first_word[0].isalpha() and 1 <= len(first_word) <= 20:
-                    # Get all commands
-                    all_commands = set()
-                    
-                    for command in self.commands:
-                        all_commands.add(command.name.lower())
-                        if hasattr(command, 'aliases') and command.aliases:
-                            for alias in command.aliases:
-                                all_commands.add(alias.lower())
-                    
-                    for cog in self.cogs.values():
-                        for command in cog.get_commands():
-                            all_commands.add(command.name.lower())
-                            if hasattr(command, 'aliases') and command.aliases:
-                                for alias in command.aliases:
-                                    all_commands.add(alias.lower())
-                    
-                    # Static commands
-                    static_commands = {
-                        'help', 'serverinfo', 'si', 'userinfo', 'ui', 'botinfo', 'bi',
-                        'ping', 'play', 'p', 'skip', 'stop', 'pause', 'resume', 'queue',
-                        'ban', 'kick', 'mute', 'unmute', 'purge', 'antinuke', 'automod',
-                        'ticket', 'premium', 'voicepanel', 'vp', 'musicpanel', 'mp'
-                    }
-                    
-                    all_commands.update(static_commands)
-                    
-                    if first_word in all_commands:
+                    if first_word in self.command_index:
                         prefix = await self.get_prefix(message)
-                        remaining_words = ' '.join(words[1:]) if len(words) > 1 else ''
-                        message.content = f"{prefix}{first_word} {remaining_words}".strip()
+                        # Subcommand names are case-sensitive, so lower the whole command path
+                        depth = max(self.command_index.path_length(words), 1)
+                        command_words = ' '.join(words[:depth]).lower()
+                        remaining_words = ' '.join(words[depth:])
+                        message.content = f"{prefix}{command_words} {remaining_words}".strip()
         
         # Process emoji placeholders in message content
         if message.content and hasattr(self, 'emoji_handler'):
             message.content = self.emoji_handler.replace_emojis(message.content)
         
-        # Process commands
-        await self.process_commands(message)
+        # Parse once; the same context serves suggestions and dispatch
+        ctx = await self.get_context(message)
+        if ctx.command is None:
+            if message.guild and ctx.prefix and ctx.invoked_with:
+                await self.send_command_suggestion(message, ctx.invoked_with.lower(), ctx.prefix)
+            return
+        
+        await self.process_commands(message, ctx)
     
     async def send_guild_join_message(self, guild):
         """Send thank you message when bot joins a guild and DM the inviter"""
@@ -423,25 +418,57 @@ class DravonBot(commands.Bot):
         except Exception as e:
             print(f"Error sending DM to inviter: {e}")
     
-    async def process_commands(self, message):
+    def claim_command_message(self, message_id):
+        """True the first time a message is dispatched as a command"""
+        if message_id in self._processed_ids:
+            return False
+        if len(self._processed_commands) == self._processed_commands.maxlen:
+            self._processed_ids.discard(self._processed_commands[0])
+        self._processed_commands.append(message_id)
+        self._processed_ids.add(message_id)
+        return True
+    
+    async def send_command_suggestion(self, message, attempted_command, prefix):
+        """Did-you-mean embed for an unknown command, at most one per channel every 10 seconds"""
+        cooldown = ("suggest", message.guild.id, message.channel.id)
+        if self.cooldowns.remaining(cooldown):
+            return
+        
+        best_match = self.command_index.suggest(attempted_command)
+        if best_match or len(attempted_command) > 2:
+            # Only a message actually sent uses up the channel's cooldown
+            self.cooldowns.trigger(cooldown, 10)
+        
+        if best_match:
+            embed = discord.Embed(
+                title="💡 Command Suggestion",
+                description=f"Did you mean `{prefix}{best_match}`?\n\n*Tip: Use `{prefix}help` to see all available commands!*",
+                color=0x7289da
+            )
+            embed.set_thumbnail(url=self.user.display_avatar.url)
+            embed.set_footer(text="Dravon™ Smart Suggestions", icon_url=self.user.display_avatar.url)
+            await message.channel.send(embed=embed, delete_after=8)
+        elif len(attempted_command) > 2:
+            # Show helpful message for unknown commands
+            embed = discord.Embed(
+                title="❓ Command Not Found",
+                description=f"Command `{attempted_command}` not found.\n\n**Quick Help:**\n• Use `{prefix}help` to see all commands\n• Try `{prefix}botinfo` for bot information\n• Need support? Use `{prefix}support`",
+                color=0xff8c00
+            )
+            embed.set_thumbnail(url=self.user.display_avatar.url)
+            embed.set_footer(text="Need help? Join our support server!", icon_url=self.user.display_avatar.url)
+            await message.channel.send(embed=embed, delete_after=10)
+    
+    async def process_commands(self, message, ctx=None):
         """Process commands with enhanced cooldown handling and duplicate prevention"""
-        ctx = await self.get_context(message)
+        if ctx is None:
+            ctx = await self.get_context(message)
         if ctx.command is None:
             return
         
         # Prevent duplicate command execution
-        command_key = f"{message.author.id}_{message.id}_{ctx.command.name}"
-        if hasattr(self, '_processed_commands'):
-            if command_key in self._processed_commands:
-                return  # Command already processed
-        else:
-            self._processed_commands = set()
-        
-        self._processed_commands.add(command_key)
-        
-        # Clean up old processed commands (keep only last 100)
-        if len(self._processed_commands) > 100:
-            self._processed_commands = set(list(self._processed_commands)[-50:])
+        if not self.claim_command_message(message.id):
+            return  # Command already processed
         
         # Track command usage
         try:
@@ -0,0 +1,161 @@
+import discord
+import asyncio
+import time
+
+class AuditLogReader:
+    """Shared audit-log lookups for antinuke handlers
+    
+    A burst of deletions used to cost one audit_logs() call per event. Here
+    entries are cached per (guild, action, target) for a short window, one
+    batch fetch per (guild, action) is shared by every handler waiting on it,
+    and entries pushed through on_audit_log_entry_create resolve waiters
+    without touching the REST API at all.
+    """
+    
+    def __init__(self, ttl=30, batch=50, gateway_wait=0.25, gateway_recent=300, max_entries=2000):
+        self.ttl = ttl
+        self.batch = batch
+        self.gateway_wait = gateway_wait  # how long to wait for the gateway before fetching
+        self.gateway_recent = gateway_recent  # only wait on guilds the gateway delivered for this recently
+        self.max_entries = max_entries
+        self.entries = {}  # (guild_id, action, target_id) -> (entry, stored_at), newest per target
+        self.recent = {}  # (guild_id, action) -> {entry id: (entry, stored_at)}, for target-less lookups
+        self.fetches = {}  # (guild_id, action) -> in-flight fetch task
+        self.waiters = {}  # (guild_id, action, target_id) -> list of futures
+        self.gateway_seen = {}  # guild_id -> monotonic time of the last gateway entry
+        self.claimed = {}  # entry id -> monotonic time it was acted on
+    
+    def _store(self, entry, now):
+        target_id = entry.target.id if entry.target else None
+        key = (entry.guild.id, entry.action)
+        # REST batches arrive newest first; an older entry must not replace a newer one
+        current = self.entries.get(key + (target_id,))
+        if current is None or current[0].id <= entry.id:
+            self.entries[key + (target_id,)] = (entry, now)
+        self.recent.setdefault(key, {})[entry.id] = (entry, now)
+        
+        if entry.id in self.claimed:
+            return  # a refetch of something already acted on; waiters want a new entry
+        self._wake(key, target_id, entry)
+    
+    def _wake(self, key, target_id, result):
+        for waiter in self.waiters.pop(key + (target_id,), ()):
+            if not waiter.done():
+                waiter.set_result(result)
+        for waiter in self.waiters.pop(key + (None,), ()):
+            if not waiter.done():
+                waiter.set_result(result)
+    
+    def _cached(self, guild_id, action, target_id, now):
+        """Newest fresh entry that has not been claimed yet
+        
+        A claimed entry counts as a miss: a second webhook, or a ban after
+        ban -> unban, inside the TTL must not be answered with the entry that
+        was already punished.
+        """
+        if target_id is not None:
+            cached = self.entries.get((guild_id, action, target_id))
+            if cached and now - cached[1] <= self.ttl and cached[0].id not in self.claimed:
+                return cached[0]
+            return None
+        
+        newest = None
+        for entry, stored_at in self.recent.get((guild_id, action), {}).values():
+            if now - stored_at <= self.ttl and entry.id not in self.claimed:
+                if newest is None or entry.id > newest.id:
+                    newest = entry
+        return newest
+    
+    def _prune(self, now):
+        cutoff = now - self.ttl
+        for key, recent in list(self.recent.items()):
+            if len(recent) > self.batch:
+                for entry_id in [entry_id for entry_id, (_, stored_at) in recent.items() if stored_at <= cutoff]:
+                    del recent[entry_id]
+                if not recent:
+                    del self.recent[key]
+        if len(self.entries) <= self.max_entries:
+            return
+        for key in [key for key, (_, stored_at) in self.entries.items() if stored_at <= cutoff]:
+            del self.entries[key]
+    
+    def claim(self, entry):
+        """True the first time an entry is acted on, so one action is never punished twice"""
+        now = time.monotonic()
+        if len(self.claimed) > self.max_entries:
+            cutoff = now - self.ttl
+            self.claimed = {entry_id: at for entry_id, at in self.claimed.items() if at > cutoff}
+        if entry.id in self.claimed:
+            return False
+        self.claimed[entry.id] = now
+        return True
+    
+    def feed(self, entry):
+        """Record an entry from on_audit_log_entry_create"""
+        now = time.monotonic()
+        self.gateway_seen[entry.guild.id] = now
+        if entry.user is None:
+            # Actor not cached; send anyone waiting on this entry to REST right away
+            self._wake((entry.guild.id, entry.action), entry.target.id if entry.target else None, None)
+            return
+        self._store(entry, now)
+        self._prune(now)
+    
+    async def _fetch(self, guild, action):
+        now = time.monotonic()
+        async for entry in guild.audit_logs(action=action, limit=self.batch):
+            if (discord.utils.utcnow() - entry.created_at).total_seconds() > self.ttl:
+                break  # newest first; everything after this is older still
+            self._store(entry, now)
+        self._prune(now)
+    
+    async def fetch(self, guild, action):
+        """Fetch the latest batch, joining a fetch that is already in flight"""
+        key = (guild.id, action)
+        task = self.fetches.get(key)
+        if task is None:
+            task = self.fetches[key] = asyncio.create_task(self._fetch(guild, action))
+            task.add_done_callback(lambda _: self.fetches.pop(key, None))
+        await asyncio.shield(task)
+    
+    async def _wait_gateway(self, guild_id, action, target_id):
+        waiter = asyncio.get_running_loop().create_future()
+        key = (guild_id, action, target_id)
+        self.waiters.setdefault(key, []).append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, self.gateway_wait)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self.waiters.get(key)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self.waiters[key]
+    
+    async def find(self, guild, action, target_id=None):
+        """Return the unclaimed audit entry for target_id (or the latest of action), or None
+        
+        Checks the cache, then briefly the gateway if it has delivered entries
+        for this guild lately, then falls back to one coalesced REST fetch.
+        The gateway usually delivers within milliseconds, so a longer wait
+        would only delay detecting actions it doesn't report.
+        """
+        now = time.monotonic()
+        entry = self._cached(guild.id, action, target_id, now)
+        if entry:
+            return entry
+        
+        if now - self.gateway_seen.get(guild.id, float("-inf")) <= self.gateway_recent:
+            entry = await self._wait_gateway(guild.id, action, target_id)
+            if entry:
+                return entry
+        
+        # A fetch already in flight may have started before this action was logged,
+        # so if it comes back without our target, fetch once more
+        for _ in range(2):
+            await self.fetch(guild, action)
+            entry = self._cached(guild.id, action, target_id, time.monotonic())
+            if entry:
+                return entry
+        return None
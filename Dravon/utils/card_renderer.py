@@ -0,0 +1,414 @@
+import asyncio
+import io
+import itertools
+import multiprocessing
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+try:
+    from PIL import Image, ImageDraw, ImageFont, ImageFilter
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+WIDTH, HEIGHT = 800, 350
+FONT_BOLD = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+FONT_REGULAR = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+STATUS_COLORS = {
+    'online': (67, 181, 129),
+    'idle': (250, 166, 26),
+    'dnd': (240, 71, 71),
+    'offline': (116, 127, 141)
+}
+
+# Colour stops per theme: background gradient top/bottom and progress bar left/right
+THEMES = {
+    "default": {
+        "gradient": ((35, 39, 42), (55, 64, 72)),
+        "bar": ((34, 197, 94), (54, 167, 114)),
+    },
+}
+
+# Lookup table for the (0, 0, 0, 150) overlay photo backgrounds are dimmed with
+_DARKEN = [value * (255 - 150) // 255 for value in range(256)]
+_KEEP = list(range(256))
+
+# Photo backgrounds are blurred with radius 8, so they are worked on at a quarter
+# of the card size (radius 2 there) and only scaled up at the end
+PHOTO_SCALE = 4
+PHOTO_BLUR = 8 // PHOTO_SCALE
+
+BAR_X, BAR_Y, BAR_WIDTH, BAR_HEIGHT = 200, 150, 550, 32
+AVATAR_SIZE = 140
+INFO_BOX = (WIDTH - 120 - 15, HEIGHT - 25 - 50, 120, 25)  # xp box; rank box sits 35px above
+TIME_BOX = (WIDTH - 80 - 15, HEIGHT - 25 - 15, 80, 25)
+
+PREPARED_MAX = 128
+_prepared = OrderedDict()  # (kind, asset key) -> decoded, resized layer, per worker process
+
+@lru_cache(maxsize=None)
+def _font(path, size):
+    """Fonts are parsed once per worker process"""
+    try:
+        return ImageFont.truetype(path, size)
+    except Exception:
+        return ImageFont.load_default()
+
+def _band(length, start, end, horizontal):
+    """A 1-pixel band interpolating start -> end, built from raw bytes in one call"""
+    data = bytearray()
+    for i in range(length):
+        ratio = i / length
+        data += bytes(int(a + (b - a) * ratio) for a, b in zip(start, end)) + b"\xff"
+    size = (length, 1) if horizontal else (1, length)
+    return Image.frombytes('RGBA', size, bytes(data))
+
+@lru_cache(maxsize=None)
+def _gradient_background(theme):
+    """Fallback background, stretched from a one-pixel-wide band"""
+    band = _band(HEIGHT, *THEMES[theme]["gradient"], horizontal=False)
+    return band.resize((WIDTH, HEIGHT), Image.Resampling.NEAREST)
+
+@lru_cache(maxsize=None)
+def _bar_fill(theme):
+    """Full-width progress fill; each card crops it to its progress"""
+    band = _band(BAR_WIDTH + 1, *THEMES[theme]["bar"], horizontal=True)
+    return band.resize((BAR_WIDTH + 1, BAR_HEIGHT - 5), Image.Resampling.NEAREST)
+
+@lru_cache(maxsize=None)
+def _avatar_mask():
+    mask = Image.new('L', (AVATAR_SIZE, AVATAR_SIZE), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, AVATAR_SIZE, AVATAR_SIZE), fill=255)
+    return mask
+
+@lru_cache(maxsize=None)
+def _chrome():
+    """Static boxes and bar track as (layer, mask)
+    
+    Pasting through the mask replaces pixels exactly like drawing the shapes
+    onto the card did, so cards look the same as before.
+    """
+    layer = Image.new('RGBA', (WIDTH, HEIGHT), (0, 0, 0, 0))
+    mask = Image.new('L', (WIDTH, HEIGHT), 0)
+    draw, mask_draw = ImageDraw.Draw(layer), ImageDraw.Draw(mask)
+    
+    shapes = [((BAR_X, BAR_Y), (BAR_X + BAR_WIDTH, BAR_Y + BAR_HEIGHT), 16, (50, 50, 50, 200))]
+    x, y, w, h = INFO_BOX
+    shapes.append(((x, y), (x + w, y + h), 12, (0, 0, 0, 120)))
+    shapes.append(((x, y - 35), (x + w, y - 35 + h), 12, (0, 0, 0, 120)))
+    x, y, w, h = TIME_BOX
+    shapes.append(((x, y), (x + w, y + h), 12, (0, 0, 0, 120)))
+    
+    for top_left, bottom_right, radius, fill in shapes:
+        draw.rounded_rectangle([top_left, bottom_right], radius=radius, fill=fill)
+        mask_draw.rounded_rectangle([top_left, bottom_right], radius=radius, fill=255)
+    return layer, mask
+
+def _background(background_bytes, theme="default"):
+    if background_bytes:
+        try:
+            bg_img = Image.open(io.BytesIO(background_bytes))
+            # The photo ends up blurred, so it is decoded, cropped and blurred at a quarter
+            # size in one resize (JPEGs even decode at reduced scale) and scaled back up
+            small_size = (WIDTH // PHOTO_SCALE, HEIGHT // PHOTO_SCALE)
+            bg_img.draft('RGB', small_size)
+            transparent = bg_img.mode in ('RGBA', 'LA', 'PA', 'RGBa', 'La') or 'transparency' in bg_img.info
+            bg_img = bg_img.convert('RGBA' if transparent else 'RGB')
+            bg_ratio = max(WIDTH / bg_img.width, HEIGHT / bg_img.height)
+            crop_width, crop_height = WIDTH / bg_ratio, HEIGHT / bg_ratio
+            left = (bg_img.width - crop_width) / 2
+            top = (bg_img.height - crop_height) / 2
+            small = bg_img.resize(
+                small_size, Image.Resampling.BILINEAR,
+                box=(left, top, left + crop_width, top + crop_height), reducing_gap=2.0
+            )
+            
+            # Dark overlay: compositing black at alpha 150 onto an opaque photo
+            # is a per-channel scale, so a lookup table does it without a layer
+            if not transparent:
+                small = small.filter(ImageFilter.GaussianBlur(radius=PHOTO_BLUR)).point(_DARKEN * 3)
+                return small.resize((WIDTH, HEIGHT), Image.Resampling.BILINEAR).convert('RGBA')
+            
+            # Transparent banners: blur premultiplied so clear pixels don't bleed black,
+            # dim the colour only, and let the theme gradient show through
+            small = small.convert('RGBa').filter(ImageFilter.GaussianBlur(radius=PHOTO_BLUR)).convert('RGBA')
+            small = small.point(_DARKEN * 3 + _KEEP)
+            layer = small.resize((WIDTH, HEIGHT), Image.Resampling.BILINEAR)
+            return Image.alpha_composite(_gradient_background(theme), layer)
+        except Exception:
+            pass
+    return _gradient_background(theme)
+
+def _avatar(avatar_bytes):
+    avatar = Image.open(io.BytesIO(avatar_bytes))
+    avatar.draft('RGB', (AVATAR_SIZE, AVATAR_SIZE))
+    avatar = avatar.convert('RGBA').resize((AVATAR_SIZE, AVATAR_SIZE), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    avatar.putalpha(_avatar_mask())
+    return avatar
+
+def _prepare(kind, key, build, data):
+    """build(data), reused while key (the asset hash and size) stays in the LRU"""
+    if key is None:
+        return build(data)
+    layer = _prepared.get((kind, key))
+    if layer is None:
+        layer = _prepared[(kind, key)] = build(data)
+        if len(_prepared) > PREPARED_MAX:
+            _prepared.popitem(last=False)
+    else:
+        _prepared.move_to_end((kind, key))
+    return layer
+
+def _centered_text(draw, box, text, font):
+    x, y, width, _ = box
+    bbox = draw.textbbox((0, 0), text, font=font)
+    draw.text((x + (width - (bbox[2] - bbox[0])) // 2, y + 6), text, fill=(255, 255, 255), font=font)
+
+def render_rank_card(spec):
+    """Draw a rank card from plain data and return PNG bytes
+    
+    Runs in a worker process, so spec holds only picklable values:
+    background and avatar image bytes, display name, status, level, xp,
+    rank, the time string and an optional theme name. Optional
+    background_key and avatar_key let the decoded images be reused.
+    """
+    theme = spec.get("theme", "default")
+    background = spec.get("background")
+    background_key = spec.get("background_key") if background else None
+    img = _prepare("background", background_key, lambda data: _background(data, theme), background).copy()
+    layer, mask = _chrome()
+    img.paste(layer, (0, 0), mask)
+    draw = ImageDraw.Draw(img)
+    
+    # Avatar with circular mask
+    avatar = _prepare("avatar", spec.get("avatar_key"), _avatar, spec["avatar"])
+    img.paste(avatar, (30, 71), avatar)
+    
+    # User status indicator
+    status_color = STATUS_COLORS.get(spec.get("status"), STATUS_COLORS['offline'])
+    draw.ellipse((155, 195, 175, 215), fill=status_color, outline=(255, 255, 255), width=4)
+    
+    # Username
+    username = spec["username"]
+    if len(username) > 20:
+        username = username[:17] + "..."
+    draw.text((200, 75), username, fill=(255, 255, 255), font=_font(FONT_BOLD, 32))
+    
+    # Progress fill, cropped from the pre-rendered gradient
+    level, xp, rank = spec["level"], spec["xp"], spec["rank"]
+    xp_needed = 100 + level * 25
+    progress_width = int(BAR_WIDTH * min(xp / xp_needed, 1))
+    if progress_width > 16:
+        img.paste(_bar_fill(theme).crop((0, 0, progress_width + 1, BAR_HEIGHT - 5)), (BAR_X, BAR_Y + 3))
+    
+    # XP, rank and time text
+    font_small = _font(FONT_REGULAR, 14)
+    x, y, w, h = INFO_BOX
+    _centered_text(draw, INFO_BOX, f"{xp} / {xp_needed} XP", font_small)
+    _centered_text(draw, (x, y - 35, w, h), f"RANK #{rank} • LVL {level}", font_small)
+    _centered_text(draw, TIME_BOX, spec["time"], _font(FONT_REGULAR, 12))
+    
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def benchmark(cards=50):
+    """Average milliseconds per card for the gradient and photo background paths
+    
+    "photo" decodes the background for every card; "photo (cached)" carries
+    asset keys like real requests do, so the worker reuses the prepared layers.
+    """
+    photo = io.BytesIO()
+    Image.effect_mandelbrot((1024, 1024), (-2, -1.5, 1, 1.5), 50).convert('RGB').save(photo, format='JPEG')
+    avatar = io.BytesIO()
+    Image.effect_noise((256, 256), 40).convert('RGB').save(avatar, format='PNG')
+    spec = {
+        "avatar": avatar.getvalue(), "username": "Benchmark", "status": "online",
+        "level": 12, "xp": 300, "rank": 4, "time": "12:00 PM"
+    }
+    
+    cached = {"background_key": "benchmark:background", "avatar_key": "benchmark:avatar"}
+    results = {}
+    for name, extra in (
+        ("gradient", {"background": None}),
+        ("photo", {"background": photo.getvalue()}),
+        ("photo (cached)", {"background": photo.getvalue(), **cached}),
+    ):
+        render_rank_card({**spec, **extra})  # warm caches
+        started = time.perf_counter()
+        for _ in range(cards):
+            render_rank_card({**spec, **extra})
+        results[name] = (time.perf_counter() - started) / cards * 1000
+    return results
+
+class RenderQueueFull(Exception):
+    pass
+
+# Everything that changes how a finished card looks; the time box has minute precision
+CARD_FIELDS = ("avatar_key", "background_key", "username", "status", "level", "xp", "rank", "theme", "time")
+
+def card_key(spec):
+    """Visual state of a card, or None when its images carry no asset keys"""
+    if not spec.get("avatar_key"):
+        return None
+    state = dict(spec, theme=spec.get("theme", "default"))
+    if not spec.get("background"):
+        state["background_key"] = None  # drawn on the gradient fallback
+    return tuple(state.get(field) for field in CARD_FIELDS)
+
+class CardRenderService:
+    """Renders cards in a process pool behind a bounded priority queue
+    
+    Lower priority numbers go first (0 for commands someone is waiting on,
+    1 for level-up announcements). When max_queue jobs are already waiting,
+    render() raises RenderQueueFull right away so callers can fall back to
+    a plain embed instead of piling up behind a burst.
+    
+    Finished PNGs are kept in an LRU of up to cache_bytes keyed by card_key,
+    and a request for a card already being rendered waits on that render.
+    
+    Workers come from a forkserver, never a fork of the threaded bot, and a
+    pool broken by a dying worker is replaced before the next render.
+    """
+    
+    def __init__(self, workers=2, max_queue=64, render=render_rank_card, cache_bytes=16 * 1024 * 1024):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.render_fn = render
+        self.pool = None
+        self.queue = None
+        self._order = itertools.count()
+        self._tasks = []
+        self.in_flight = 0
+        self.rendered = 0
+        self.failed = 0
+        self.rejected = 0
+        self.render_times = deque(maxlen=200)  # seconds spent in the worker
+        self.wait_times = deque(maxlen=200)  # seconds spent queued
+        self.cache_bytes = cache_bytes
+        self.results = OrderedDict()  # card_key -> PNG bytes
+        self.results_size = 0
+        self.rendering = {}  # card_key -> future of the render in progress
+        self.cache_hits = 0
+    
+    def _start(self):
+        if self._tasks:
+            return
+        self.pool = self._new_pool()
+        self.queue = asyncio.PriorityQueue(maxsize=self.max_queue)
+        self._tasks = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+    
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver"))
+    
+    def _replace_pool(self, broken):
+        # Every dispatcher sharing the broken pool sees the error; only the first replaces it
+        if self.pool is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._new_pool()
+            print("⚠️ Card renderer worker died; restarted the render pool")
+    
+    def _remember(self, key, future):
+        if self.rendering.get(key) is future:
+            del self.rendering[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        result = future.result()
+        self.results[key] = result
+        self.results_size += len(result)
+        while self.results_size > self.cache_bytes and self.results:
+            _, evicted = self.results.popitem(last=False)
+            self.results_size -= len(evicted)
+    
+    async def render(self, spec, priority=1):
+        """PNG bytes for spec; raises RenderQueueFull under backpressure"""
+        key = card_key(spec)
+        if key is not None:
+            cached = self.results.get(key)
+            if cached is not None:
+                self.results.move_to_end(key)
+                self.cache_hits += 1
+                return cached
+            pending = self.rendering.get(key)
+            if pending is not None:
+                self.cache_hits += 1
+                return await asyncio.shield(pending)
+        
+        self._start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((priority, next(self._order), time.monotonic(), spec, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise RenderQueueFull()
+        if key is not None:
+            self.rendering[key] = future
+            future.add_done_callback(lambda done: self._remember(key, done))
+        return await asyncio.shield(future)
+    
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, queued_at, spec, future = await self.queue.get()
+            if future.cancelled():
+                self.queue.task_done()
+                continue
+            
+            self.wait_times.append(time.monotonic() - queued_at)
+            self.in_flight += 1
+            started = time.monotonic()
+            pool = self.pool
+            try:
+                result = await loop.run_in_executor(pool, self.render_fn, spec)
+                self.rendered += 1
+                if not future.done():
+                    future.set_result(result)
+            except BrokenProcessPool as e:
+                self.failed += 1
+                self._replace_pool(pool)
+                if not future.done():
+                    future.set_exception(e)
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.render_times.append(time.monotonic() - started)
+                self.in_flight -= 1
+                self.queue.task_done()
+    
+    def stats(self):
+        def percentile(samples, fraction):
+            if not samples:
+                return 0.0
+            ordered = sorted(samples)
+            return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+        
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "in_flight": self.in_flight,
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "cache_hits": self.cache_hits,
+            "cached": len(self.results),
+            "render_p50_ms": percentile(self.render_times, 0.5) * 1000,
+            "render_p95_ms": percentile(self.render_times, 0.95) * 1000,
+            "wait_p95_ms": percentile(self.wait_times, 0.95) * 1000,
+        }
+    
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+if __name__ == "__main__":
+    for path, ms in benchmark().items():
+        print(f"{path}: {ms:.1f} ms/card")
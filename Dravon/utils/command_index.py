@@ -0,0 +1,158 @@
+from bisect import bisect_left
+
+def edit_distance(a, b):
+    """Levenshtein distance"""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        previous = current
+    return previous[-1]
+
+class BKTree:
+    """Words indexed by edit distance; a search visits only children whose
+    edge distance is within max_distance of the query's distance to the node"""
+    
+    def __init__(self, words=()):
+        self.root = None  # [word, {distance: child node}]
+        for word in words:
+            self.add(word)
+    
+    def add(self, word):
+        if self.root is None:
+            self.root = [word, {}]
+            return
+        node = self.root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [word, {}]
+                return
+            node = child
+    
+    def search(self, word, max_distance):
+        """[(distance, word), ...] within max_distance, closest first"""
+        if self.root is None:
+            return []
+        matches, stack = [], [self.root]
+        while stack:
+            candidate, children = stack.pop()
+            distance = edit_distance(word, candidate)
+            if distance <= max_distance:
+                matches.append((distance, candidate))
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        return sorted(matches)
+
+class CommandIndex:
+    """Lower-cased command names and aliases as frozen sets
+    
+    names holds top-level names and aliases (what a no-prefix message can
+    start with). paths holds every command path, subcommands of hybrid
+    groups included, e.g. "antinuke restore", under every combination of
+    aliases. Both are rebuilt lazily on the first lookup after invalidate(),
+    so loading sixty extensions at startup still builds the index once.
+    
+    suggest() maps an unknown command name to a registered one: exact hints
+    first, then the closest name or alias in a BK-tree, then a prefix match.
+    """
+    
+    def __init__(self, bot, static=(), hints=None):
+        self.bot = bot
+        self.static = frozenset(name.lower() for name in static)
+        self.hints = hints or {}  # synonym -> command name, used only if that command exists
+        self._names = None
+        self._paths = None
+        self._depth = 1  # words in the longest path
+        self._targets = {}  # top-level name or alias -> command name
+        self._tree = None
+        self._sorted = []
+    
+    def invalidate(self):
+        self._names = None
+        self._paths = None
+    
+    def _build(self):
+        names, targets, paths = set(self.static), {}, set()
+        stack = [((), command) for command in self.bot.commands]
+        while stack:
+            parents, command = stack.pop()
+            aliases = [alias.lower() for alias in [command.name] + list(command.aliases)]
+            if not parents:
+                names.update(aliases)
+                targets.update((alias, command.name) for alias in aliases)
+            own = [parent + (alias,) for parent in parents or [()] for alias in aliases]
+            paths.update(" ".join(path) for path in own)
+            for child in getattr(command, "commands", ()):
+                stack.append((own, child))
+        self._names = frozenset(names)
+        self._paths = frozenset(paths)
+        self._depth = max((path.count(" ") + 1 for path in paths), default=1)
+        self._targets = targets
+        self._tree = BKTree(targets)
+        self._sorted = sorted(targets)
+    
+    @property
+    def names(self):
+        if self._names is None:
+            self._build()
+        return self._names
+    
+    @property
+    def paths(self):
+        if self._paths is None:
+            self._build()
+        return self._paths
+    
+    def path_length(self, words):
+        """How many leading words form a registered command path, matched case-insensitively"""
+        paths = self.paths
+        for length in range(min(len(words), self._depth), 0, -1):
+            if " ".join(words[:length]).lower() in paths:
+                return length
+        return 0
+    
+    def __contains__(self, name):
+        return name in self.names
+    
+    def suggest(self, word):
+        """The registered command name closest to word, or None"""
+        self.names  # builds the index if it is stale
+        word = word.lower()
+        if word in self._targets:
+            return None  # not unknown
+        
+        hint = self.hints.get(word)
+        if hint and hint in self._targets:
+            return self._targets[hint]
+        
+        # Fuzzy matches on one or two letters are noise ("au" -> "ai"); hints above still apply
+        if len(word) < 3:
+            return None
+        
+        # A swap of two letters costs two edits, so allow two beyond very short words,
+        # and a three-letter word must keep its first letter
+        max_distance = 1 if len(word) <= 3 else 2
+        matches = self._tree.search(word, max_distance)
+        if len(word) <= 3:
+            matches = [match for match in matches if match[1][0] == word[0]]
+        if matches:
+            best = min(matches, key=lambda match: (match[0], not match[1].startswith(word[0]), len(match[1])))
+            return self._targets[best[1]]
+        
+        # Truncated names: the first command, alphabetically, starting with word
+        start = bisect_left(self._sorted, word)
+        if start < len(self._sorted) and self._sorted[start].startswith(word):
+            return self._targets[self._sorted[start]]
+        return None
@@ -1,17 +1,533 @@
 import aiosqlite
+import asyncio
+import copy
 import json
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
+from utils.rank_index import RankIndex
 
-class Database:
+class ConnectionPool:
+    """Long-lived SQLite connections: one serialized writer plus a few readers"""
+    
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA cache_size=-16000",  # ~16 MB page cache per connection
+        "PRAGMA mmap_size=268435456",  # 256 MB memory-mapped I/O
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA busy_timeout=5000"
+    )
+    
+    def __init__(self, db_path, readers=4):
+        self.db_path = db_path
+        self.reader_count = max(1, readers)
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+        self._readers = []
+        self._idle_readers = None
+        self._closed = False
+    
+    async def _connect(self, read_only=False):
+        conn = await aiosqlite.connect(self.db_path)
+        for pragma in self.PRAGMAS:
+            await conn.execute(pragma)
+        if read_only:
+            await conn.execute("PRAGMA query_only=1")
+        return conn
+    
+    async def open(self):
+        if self._writer is not None:
+            return
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+            
+            self._idle_readers = asyncio.Queue()
+            for _ in range(self.reader_count):
+                conn = await self._connect(read_only=True)
+                self._readers.append(conn)
+                self._idle_readers.put_nowait(conn)
+            self._writer = await self._connect()
+    
+    @asynccontextmanager
+    async def reader(self):
+        await self.open()
+        conn = await self._idle_readers.get()
+        try:
+            yield conn
+        finally:
+            self._idle_readers.put_nowait(conn)
+    
+    @asynccontextmanager
+    async def writer(self):
+        await self.open()
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                # Never leave a half-finished transaction on the shared writer
+                if self._writer.in_transaction:
+                    await self._writer.rollback()
+                raise
+            else:
+                if self._writer.in_transaction:
+                    await self._writer.commit()
+    
+    async def close(self):
+        async with self._open_lock:
+            self._closed = True
+            if self._writer is not None:
+                async with self._write_lock:
+                    if self._writer.in_transaction:
+                        await self._writer.commit()
+                    # Fold the WAL back into the main file so restarts start clean
+                    await self._writer.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    await self._writer.close()
+                self._writer = None
+            for conn in self._readers:
+                await conn.close()
+            self._readers.clear()
+            self._idle_readers = None
+
+class MessageCounterBuffer:
+    """Write-behind aggregation of message counts, flushed in one transaction"""
+    
+    def __init__(self, pool, flush_interval=5.0, max_events=500):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.pending = {}  # (guild_id, user_id, date) -> unflushed increments
+        self.flushing = {}  # batch currently being written, still visible to reads
+        self.events = 0
+        self._flush_task = None
+        self._flush_now = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+    
+    def add(self, guild_id, user_id, date, amount=1):
+        key = (guild_id, user_id, date)
+        self.pending[key] = self.pending.get(key, 0) + amount
+        self.events += amount
+        
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._run())
+        if self.events >= self.max_events:
+            self._flush_now.set()
+    
+    async def _run(self):
+        try:
+            while self.pending:
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_now.clear()
+                
+                try:
+                    # Shielded so shutdown never cancels a batch mid-transaction
+                    await asyncio.shield(self.flush())
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"⚠️ Failed to flush message counts: {e}")
+        finally:
+            self._flush_task = None
+    
+    def pending_total(self, guild_id, user_id):
+        return sum(
+            count
+            for batch in (self.pending, self.flushing)
+            for (g, u, _), count in batch.items()
+            if g == guild_id and u == user_id
+        )
+    
+    def pending_on(self, guild_id, user_id, date):
+        key = (guild_id, user_id, date)
+        return self.pending.get(key, 0) + self.flushing.get(key, 0)
+    
+    async def flush(self):
+        async with self._flush_lock:
+            if not self.pending:
+                return
+            
+            batch, self.pending, self.events = self.pending, {}, 0
+            self.flushing = batch
+            totals = {}
+            for (guild_id, user_id, _), count in batch.items():
+                totals[(guild_id, user_id)] = totals.get((guild_id, user_id), 0) + count
+            
+            try:
+                async with self.pool.writer() as db:
+                    await db.executemany(
+                        "INSERT INTO user_messages (guild_id, user_id, message_count) VALUES (?, ?, ?) "
+                        "ON CONFLICT(guild_id, user_id) DO UPDATE SET message_count = message_count + excluded.message_count",
+                        [(guild_id, user_id, count) for (guild_id, user_id), count in totals.items()]
+                    )
+                    await db.executemany(
+                        "INSERT INTO daily_messages (guild_id, user_id, date, message_count) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(guild_id, user_id, date) DO UPDATE SET message_count = message_count + excluded.message_count",
+                        [(guild_id, user_id, date, count) for (guild_id, user_id, date), count in batch.items()]
+                    )
+                    await db.commit()
+            except BaseException:
+                # Put the batch back so the next flush retries it
+                for key, count in batch.items():
+                    self.pending[key] = self.pending.get(key, 0) + count
+                    self.events += count
+                raise
+            finally:
+                self.flushing = {}
+    
+    async def close(self):
+        task = self._flush_task
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+class XPLedger:
+    """In-memory XP per guild, loaded on first use and written behind in batches
+    
+    Gains and level-ups are applied to memory immediately; dirty rows are
+    upserted with absolute values, so a retried flush can never double count.
+    """
+    
+    def __init__(self, pool, flush_interval=10.0, idle_ttl=3600):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.idle_ttl = idle_ttl
+        self.guilds = {}  # guild_id -> {user_id: [xp, level]}
+        self.ranks = {}  # guild_id -> RankIndex over xp
+        self.last_used = {}  # guild_id -> monotonic time of last access
+        self.dirty = set()  # (guild_id, user_id)
+        self._loads = {}  # guild_id -> in-flight load task
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+    
+    async def _load(self, guild_id):
+        try:
+            async with self.pool.reader() as db:
+                cursor = await db.execute("SELECT user_id, xp, level FROM user_xp WHERE guild_id = ?", (guild_id,))
+                rows = await cursor.fetchall()
+            users = {user_id: [xp, level] for user_id, xp, level in rows}
+            self.ranks[guild_id] = RankIndex({user_id: xp for user_id, xp, _ in rows})
+            self.guilds[guild_id] = users
+            return users
+        finally:
+            self._loads.pop(guild_id, None)
+    
+    async def guild(self, guild_id):
+        """Every user's [xp, level] for a guild, sharing one load between concurrent callers"""
+        self.last_used[guild_id] = time.monotonic()
+        users = self.guilds.get(guild_id)
+        if users is not None:
+            return users
+        
+        task = self._loads.get(guild_id)
+        if task is None:
+            task = self._loads[guild_id] = asyncio.create_task(self._load(guild_id))
+        return await asyncio.shield(task)
+    
+    async def rank_index(self, guild_id):
+        await self.guild(guild_id)
+        return self.ranks[guild_id]
+    
+    async def get(self, guild_id, user_id):
+        entry = (await self.guild(guild_id)).get(user_id)
+        return (entry[0], entry[1]) if entry else None
+    
+    async def set(self, guild_id, user_id, xp, level):
+        users = await self.guild(guild_id)
+        users[user_id] = [xp, level]
+        self.ranks[guild_id].update(user_id, xp)
+        self._mark(guild_id, user_id)
+    
+    async def add(self, guild_id, user_id, amount, level_of):
+        """Apply an XP gain and return (old level, new xp, new level)"""
+        users = await self.guild(guild_id)
+        entry = users.get(user_id)
+        if entry is None:
+            entry = users[user_id] = [0, 1]
+        old_level = entry[1]
+        entry[0] += amount
+        entry[1] = level_of(entry[0])
+        self.ranks[guild_id].update(user_id, entry[0])
+        self._mark(guild_id, user_id)
+        return old_level, entry[0], entry[1]
+    
+    def _mark(self, guild_id, user_id):
+        self.dirty.add((guild_id, user_id))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._run())
+    
+    async def _run(self):
+        try:
+            while self.dirty:
+                await asyncio.sleep(self.flush_interval)
+                try:
+                    await asyncio.shield(self.flush())
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"⚠️ Failed to flush XP: {e}")
+                self.evict_idle()
+        finally:
+            self._flush_task = None
+    
+    async def flush(self):
+        async with self._flush_lock:
+            if not self.dirty:
+                return
+            
+            batch, self.dirty = self.dirty, set()
+            rows = [
+                (guild_id, user_id, *self.guilds[guild_id][user_id])
+                for guild_id, user_id in batch
+                if user_id in self.guilds.get(guild_id, {})
+            ]
+            try:
+                async with self.pool.writer() as db:
+                    await db.executemany(
+                        "INSERT INTO user_xp (guild_id, user_id, xp, level) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(guild_id, user_id) DO UPDATE SET xp = excluded.xp, level = excluded.level",
+                        rows
+                    )
+                    await db.commit()
+            except BaseException:
+                self.dirty |= batch
+                raise
+    
+    def evict_idle(self):
+        """Drop guilds with nothing unflushed that haven't been used for idle_ttl"""
+        cutoff = time.monotonic() - self.idle_ttl
+        busy = {guild_id for guild_id, _ in self.dirty}
+        for guild_id in [g for g, used in self.last_used.items() if used <= cutoff and g not in busy]:
+            self.guilds.pop(guild_id, None)
+            self.ranks.pop(guild_id, None)
+            self.last_used.pop(guild_id, None)
+    
+    async def close(self):
+        task = self._flush_task
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+class PrefixCache:
+    """guild_id -> prefix map, optionally bounded as an LRU"""
+    
+    def __init__(self, max_size=None, default=">"):
+        self.max_size = max_size
+        self.default = default
+        self.entries = OrderedDict()
+        self.complete = False  # True while every stored prefix is in memory
+    
+    def get(self, guild_id):
+        prefix = self.entries.get(guild_id)
+        if prefix is not None:
+            if self.max_size:
+                self.entries.move_to_end(guild_id)
+            return prefix
+        # With the whole table resident, a miss simply means the default prefix
+        return self.default if self.complete else None
+    
+    def set(self, guild_id, prefix):
+        self.entries[guild_id] = prefix
+        if self.max_size:
+            self.entries.move_to_end(guild_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.complete = False
+    
+    def load(self, rows):
+        self.entries.clear()
+        self.complete = True
+        for guild_id, prefix in rows:
+            self.set(guild_id, prefix)
+
+class PremiumEntitlements:
+    """premium_users and premium_guilds held in memory, guilds indexed by activator
+    
+    Expiries are kept as timestamps, so an entitlement lapses at exactly its
+    expiry time with a single comparison and nothing has to be rescheduled.
+    Until load() has run, the lookups return None and callers use the database.
+    """
+    
     def __init__(self):
+        self.users = {}  # user_id -> expiry timestamp (inf for lifetime)
+        self.guilds = {}  # guild_id -> (activator_id, activated_at)
+        self.by_activator = {}  # activator_id -> set of guild ids
+        self.complete = False
+    
+    @staticmethod
+    def _deadline(expiry):
+        if expiry is None:
+            return float("inf")
+        if isinstance(expiry, str):
+            expiry = datetime.fromisoformat(expiry)
+        return expiry.timestamp()
+    
+    def load(self, user_rows, guild_rows):
+        self.users = {user_id: self._deadline(expiry) for user_id, expiry in user_rows}
+        self.guilds, self.by_activator = {}, {}
+        for guild_id, activator_id, activated_at in guild_rows:
+            self.set_guild(guild_id, activator_id, activated_at)
+        self.complete = True
+    
+    def set_user(self, user_id, expiry):
+        self.users[user_id] = self._deadline(expiry)
+    
+    def remove_user(self, user_id):
+        self.users.pop(user_id, None)
+    
+    def set_guild(self, guild_id, activator_id, activated_at):
+        previous = self.guilds.get(guild_id)
+        if previous:
+            self.by_activator.get(previous[0], set()).discard(guild_id)
+        self.guilds[guild_id] = (activator_id, activated_at)
+        self.by_activator.setdefault(activator_id, set()).add(guild_id)
+    
+    def user_active(self, user_id):
+        if not self.complete:
+            return None
+        return time.time() < self.users.get(user_id, 0)
+    
+    def guild_active(self, guild_id):
+        """Active while the guild's activator still has premium"""
+        if not self.complete:
+            return None
+        entry = self.guilds.get(guild_id)
+        return entry is not None and time.time() < self.users.get(entry[0], 0)
+
+class GuildConfig:
+    """In-memory snapshot of the per-guild settings read on the message path"""
+    
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.automod = {}  # rule_type -> config
+        self.autorule = {}
+        self.antinuke = {}
+        self.extra_owners = set()
+        self.prefix = ">"
+        self.ai_channel = None
+        self.levelup = None
+        self.autoresponders = {}  # trigger -> config, replaced wholesale on every change
+    
+    @property
+    def whitelist(self):
+        whitelist = self.antinuke.get("whitelist") or {}
+        return set(whitelist.get("users", []))
+    
+    def is_whitelisted(self, user_id):
+        return user_id in self.extra_owners or user_id in self.whitelist
+    
+    @staticmethod
+    def _rows_to_rules(rows):
+        return {rule_type: json.loads(config) for rule_type, config in rows}
+    
+    @classmethod
+    async def load(cls, db, guild_id):
+        config = cls(guild_id)
+        
+        cursor = await db.execute("SELECT rule_type, config FROM automod_rules WHERE guild_id = ?", (guild_id,))
+        config.automod = cls._rows_to_rules(await cursor.fetchall())
+        cursor = await db.execute("SELECT rule_type, config FROM autorule_rules WHERE guild_id = ?", (guild_id,))
+        config.autorule = cls._rows_to_rules(await cursor.fetchall())
+        cursor = await db.execute("SELECT rule_type, config FROM antinuke_rules WHERE guild_id = ?", (guild_id,))
+        config.antinuke = cls._rows_to_rules(await cursor.fetchall())
+        
+        cursor = await db.execute("SELECT user_id FROM extra_owners WHERE guild_id = ?", (guild_id,))
+        config.extra_owners = {row[0] for row in await cursor.fetchall()}
+        
+        cursor = await db.execute("SELECT prefix FROM prefixes WHERE guild_id = ?", (guild_id,))
+        result = await cursor.fetchone()
+        config.prefix = result[0] if result else ">"
+        
+        cursor = await db.execute("SELECT channel_id FROM ai_channels WHERE guild_id = ?", (guild_id,))
+        result = await cursor.fetchone()
+        config.ai_channel = result[0] if result else None
+        
+        cursor = await db.execute("SELECT config FROM levelup_config WHERE guild_id = ?", (guild_id,))
+        result = await cursor.fetchone()
+        config.levelup = json.loads(result[0]) if result else None
+        
+        cursor = await db.execute("SELECT trigger, config FROM autoresponders WHERE guild_id = ?", (guild_id,))
+        config.autoresponders = cls._rows_to_rules(await cursor.fetchall())
+        
+        return config
+
+class Database:
+    def __init__(self, readers=4, prefix_cache_size=None, message_rank_ttl=3600):
         self.db_path = "dravon.db"
         self.init_db()
+        self.pool = ConnectionPool(self.db_path, readers=readers)
+        self.message_counts = MessageCounterBuffer(self.pool)
+        self.xp = XPLedger(self.pool)
+        self.message_ranks = {}  # guild_id -> RankIndex over total messages
+        self._message_rank_loads = {}  # guild_id -> in-flight load task
+        self.message_rank_ttl = message_rank_ttl
+        self._message_rank_used = {}  # guild_id -> monotonic time the index was last read
+        self._next_rank_eviction = 0.0
+        self.prefixes = PrefixCache(max_size=prefix_cache_size)
+        self.premium = PremiumEntitlements()
+        self.guild_configs = {}  # guild_id -> GuildConfig
+        self._guild_config_loads = {}  # guild_id -> in-flight load task
+        self._guild_config_writes = {}  # guild_id -> write counter, guards stale loads
+    
+    async def close(self):
+        try:
+            await self.message_counts.close()
+            await self.xp.close()
+        finally:
+            await self.pool.close()
+    
+    # Guild config snapshot methods
+    async def get_guild_config(self, guild_id):
+        """Return the cached GuildConfig, loading it once on first use"""
+        config = self.guild_configs.get(guild_id)
+        if config is not None:
+            return config
+        
+        # Concurrent messages for a cold guild share a single load
+        task = self._guild_config_loads.get(guild_id)
+        if task is None:
+            task = asyncio.create_task(self._load_guild_config(guild_id))
+            self._guild_config_loads[guild_id] = task
+        return await asyncio.shield(task)
+    
+    async def _load_guild_config(self, guild_id):
+        try:
+            writes = self._guild_config_writes.get(guild_id, 0)
+            async with self.pool.reader() as db:
+                config = await GuildConfig.load(db, guild_id)
+            
+            # A set_* landed mid-load; the snapshot may predate it, so don't keep it
+            if self._guild_config_writes.get(guild_id, 0) == writes:
+                self.guild_configs[guild_id] = config
+            return config
+        finally:
+            self._guild_config_loads.pop(guild_id, None)
+    
+    def _touch_guild_config(self, guild_id):
+        self._guild_config_writes[guild_id] = self._guild_config_writes.get(guild_id, 0) + 1
+        return self.guild_configs.get(guild_id)
+    
+    def invalidate_guild_config(self, guild_id):
+        self._touch_guild_config(guild_id)
+        self.guild_configs.pop(guild_id, None)
     
     def init_db(self):
         import sqlite3
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # WAL is persistent on the file, so readers never block the writer
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
         # Create all necessary tables
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS prefixes (
@@ -65,6 +581,15 @@ class Database:
             )
         ''')
         
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS autoresponders (
+                guild_id INTEGER,
+                trigger TEXT,
+                config TEXT,
+                PRIMARY KEY (guild_id, trigger)
+            )
+        ''')
+        
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS bot_admins (
                 user_id INTEGER PRIMARY KEY
@@ -259,44 +784,73 @@ class Database:
             )
         ''')
         
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS guild_snapshots (
+                guild_id INTEGER,
+                kind TEXT,
+                object_id INTEGER,
+                data TEXT,
+                deleted_at REAL,
+                PRIMARY KEY (guild_id, kind, object_id)
+            )
+        ''')
+        
         conn.commit()
         conn.close()
     
+    async def load_prefixes(self):
+        async with self.pool.reader() as db:
+            cursor = await db.execute("SELECT guild_id, prefix FROM prefixes")
+            results = await cursor.fetchall()
+        self.prefixes.load(results)
+        return len(results)
+    
     async def get_prefix(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        prefix = self.prefixes.get(guild_id)
+        if prefix is not None:
+            return prefix
+        
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT prefix FROM prefixes WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
-            return result[0] if result else ">"
+        prefix = result[0] if result else self.prefixes.default
+        self.prefixes.set(guild_id, prefix)
+        return prefix
     
     async def set_prefix(self, guild_id, prefix):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO prefixes (guild_id, prefix) VALUES (?, ?)", (guild_id, prefix))
             await db.commit()
+        
+        self.prefixes.set(guild_id, prefix)
+        config = self._touch_guild_config(guild_id)
+        if config:
+            config.prefix = prefix
     
     async def get_bot_admins(self):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT user_id FROM bot_admins")
             results = await cursor.fetchall()
             return [row[0] for row in results]
     
     async def add_bot_admin(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR IGNORE INTO bot_admins (user_id) VALUES (?)", (user_id,))
             await db.commit()
     
     async def remove_bot_admin(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM bot_admins WHERE user_id = ?", (user_id,))
             await db.commit()
     
     async def set_afk_user(self, user_id, reason, global_afk=False, guild_id=None):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO afk_users (user_id, reason, timestamp, global_afk, guild_id) VALUES (?, ?, ?, ?, ?)", 
                            (user_id, reason, datetime.now().timestamp(), global_afk, guild_id))
             await db.commit()
     
     async def get_afk_user(self, user_id, guild_id=None):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             # Check for global AFK first
             cursor = await db.execute("SELECT reason, timestamp, global_afk FROM afk_users WHERE user_id = ? AND global_afk = 1", (user_id,))
             result = await cursor.fetchone()
@@ -313,7 +867,7 @@ class Database:
             return None
     
     async def remove_afk_user(self, user_id, guild_id=None):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             if guild_id is None:
                 # Remove global AFK
                 await db.execute("DELETE FROM afk_users WHERE user_id = ? AND global_afk = 1", (user_id,))
@@ -322,8 +876,17 @@ class Database:
                 await db.execute("DELETE FROM afk_users WHERE user_id = ? AND guild_id = ? AND global_afk = 0", (user_id, guild_id))
             await db.commit()
     
+    async def load_premium(self):
+        async with self.pool.reader() as db:
+            cursor = await db.execute("SELECT user_id, expiry FROM premium_users")
+            users = await cursor.fetchall()
+            cursor = await db.execute("SELECT guild_id, activator_id, activated_at FROM premium_guilds")
+            guilds = await cursor.fetchall()
+        self.premium.load(users, guilds)
+        return len(users), len(guilds)
+    
     async def get_premium_user(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT expiry, music_mode FROM premium_users WHERE user_id = ?", (user_id,))
             result = await cursor.fetchone()
             if result:
@@ -332,17 +895,23 @@ class Database:
     
     async def set_premium_user(self, user_id, expiry_date):
         expiry_str = expiry_date.isoformat() if expiry_date else None
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO premium_users (user_id, expiry) VALUES (?, ?)", (user_id, expiry_str))
             await db.commit()
+        self.premium.set_user(user_id, expiry_date)
     
     async def remove_premium_user(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM premium_users WHERE user_id = ?", (user_id,))
             await db.commit()
+        self.premium.remove_user(user_id)
     
     async def get_premium_guild(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        if self.premium.complete:
+            entry = self.premium.guilds.get(guild_id)
+            return {"activator_id": entry[0], "activated_at": entry[1]} if entry else None
+        
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT activator_id, activated_at FROM premium_guilds WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             if result:
@@ -350,63 +919,75 @@ class Database:
             return None
     
     async def set_premium_guild(self, guild_id, activator_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        activated_at = datetime.now().timestamp()
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO premium_guilds (guild_id, activator_id, activated_at) VALUES (?, ?, ?)", 
-                           (guild_id, activator_id, datetime.now().timestamp()))
+                           (guild_id, activator_id, activated_at))
             await db.commit()
+        self.premium.set_guild(guild_id, activator_id, activated_at)
     
     async def get_user_premium_guilds(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        if self.premium.complete:
+            return list(self.premium.by_activator.get(user_id, ()))
+        
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT guild_id FROM premium_guilds WHERE activator_id = ?", (user_id,))
             results = await cursor.fetchall()
             return [row[0] for row in results]
     
     async def get_premium_music_mode(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT music_mode FROM premium_users WHERE user_id = ?", (user_id,))
             result = await cursor.fetchone()
             return result[0] if result else "lavalink"
     
     async def set_premium_music_mode(self, user_id, mode):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO premium_users (user_id, music_mode) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET music_mode = ?", 
                            (user_id, mode, mode))
             await db.commit()
+        if self.premium.complete and user_id not in self.premium.users:
+            self.premium.set_user(user_id, None)  # the insert created a row with no expiry
     
     async def get_antinuke_rule(self, guild_id, rule_type):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT config FROM antinuke_rules WHERE guild_id = ? AND rule_type = ?", (guild_id, rule_type))
-            result = await cursor.fetchone()
-            if result:
-                return json.loads(result[0])
-            return None
+        config = await self.get_guild_config(guild_id)
+        return copy.deepcopy(config.antinuke.get(rule_type))
     
     async def set_antinuke_rule(self, guild_id, rule_type, config):
-        async with aiosqlite.connect(self.db_path) as db:
+        data = json.dumps(config)
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO antinuke_rules (guild_id, rule_type, config) VALUES (?, ?, ?)", 
-                           (guild_id, rule_type, json.dumps(config)))
+                           (guild_id, rule_type, data))
             await db.commit()
+        
+        snapshot = self._touch_guild_config(guild_id)
+        if snapshot:
+            snapshot.antinuke[rule_type] = json.loads(data)
+    
+    async def get_automod_rule(self, guild_id, rule_type):
+        config = await self.get_guild_config(guild_id)
+        return copy.deepcopy(config.automod.get(rule_type))
     
     async def get_all_automod_rules(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT rule_type, config FROM automod_rules WHERE guild_id = ?", (guild_id,))
-            results = await cursor.fetchall()
-            rules = {}
-            for rule_type, config in results:
-                rules[rule_type] = json.loads(config)
-            return rules
+        config = await self.get_guild_config(guild_id)
+        return copy.deepcopy(config.automod)
     
     async def set_automod_rule(self, guild_id, rule_type, config):
-        async with aiosqlite.connect(self.db_path) as db:
+        data = json.dumps(config)
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO automod_rules (guild_id, rule_type, config) VALUES (?, ?, ?)", 
-                           (guild_id, rule_type, json.dumps(config)))
+                           (guild_id, rule_type, data))
             await db.commit()
+        
+        snapshot = self._touch_guild_config(guild_id)
+        if snapshot:
+            snapshot.automod[rule_type] = json.loads(data)
     
     async def set_automod_logs_channel(self, guild_id, channel_id):
         await self.set_automod_rule(guild_id, "logs_channel", {"channel_id": channel_id})
     
     async def get_247_mode(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT settings FROM guild_settings WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             if result:
@@ -415,7 +996,7 @@ class Database:
             return False
     
     async def set_247_mode(self, guild_id, enabled):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             cursor = await db.execute("SELECT settings FROM guild_settings WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             
@@ -437,6 +1018,33 @@ class Database:
             return True
         return False
     
+    # Autoresponder system methods
+    async def get_autoresponders(self, guild_id):
+        config = await self.get_guild_config(guild_id)
+        return copy.deepcopy(config.autoresponders)
+    
+    async def set_autoresponder(self, guild_id, trigger, config):
+        data = json.dumps(config)
+        async with self.pool.writer() as db:
+            await db.execute("INSERT OR REPLACE INTO autoresponders (guild_id, trigger, config) VALUES (?, ?, ?)", 
+                           (guild_id, trigger, data))
+            await db.commit()
+        
+        snapshot = self._touch_guild_config(guild_id)
+        if snapshot:
+            snapshot.autoresponders = {**snapshot.autoresponders, trigger: json.loads(data)}
+    
+    async def delete_autoresponder(self, guild_id, trigger):
+        async with self.pool.writer() as db:
+            cursor = await db.execute("DELETE FROM autoresponders WHERE guild_id = ? AND trigger = ?", (guild_id, trigger))
+            await db.commit()
+            deleted = cursor.rowcount > 0
+        
+        snapshot = self._touch_guild_config(guild_id)
+        if snapshot and trigger in snapshot.autoresponders:
+            snapshot.autoresponders = {t: c for t, c in snapshot.autoresponders.items() if t != trigger}
+        return deleted
+    
     # Welcome system methods
     async def get_welcome_config(self, guild_id):
         return {}
@@ -493,7 +1101,7 @@ class Database:
     
     # Embed system methods
     async def set_embed_setting(self, guild_id, embed_name, setting, value):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             cursor = await db.execute("SELECT config FROM embeds WHERE guild_id = ? AND embed_name = ?", (guild_id, embed_name))
             result = await cursor.fetchone()
             
@@ -509,7 +1117,7 @@ class Database:
             await db.commit()
     
     async def get_embed_config(self, guild_id, embed_name):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT config FROM embeds WHERE guild_id = ? AND embed_name = ?", (guild_id, embed_name))
             result = await cursor.fetchone()
             if result:
@@ -517,7 +1125,7 @@ class Database:
             return {}
     
     async def get_all_embeds(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT embed_name, config FROM embeds WHERE guild_id = ?", (guild_id,))
             results = await cursor.fetchall()
             embeds = {}
@@ -526,7 +1134,7 @@ class Database:
             return embeds
     
     async def delete_embed(self, guild_id, embed_name):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             cursor = await db.execute("DELETE FROM embeds WHERE guild_id = ? AND embed_name = ?", (guild_id, embed_name))
             await db.commit()
             return cursor.rowcount > 0
@@ -540,27 +1148,23 @@ class Database:
     
     # AutoRule system methods
     async def set_autorule_rule(self, guild_id, rule_type, config):
-        async with aiosqlite.connect(self.db_path) as db:
+        data = json.dumps(config)
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO autorule_rules (guild_id, rule_type, config) VALUES (?, ?, ?)", 
-                           (guild_id, rule_type, json.dumps(config)))
+                           (guild_id, rule_type, data))
             await db.commit()
+        
+        snapshot = self._touch_guild_config(guild_id)
+        if snapshot:
+            snapshot.autorule[rule_type] = json.loads(data)
     
     async def get_autorule_rule(self, guild_id, rule_type):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT config FROM autorule_rules WHERE guild_id = ? AND rule_type = ?", (guild_id, rule_type))
-            result = await cursor.fetchone()
-            if result:
-                return json.loads(result[0])
-            return None
+        config = await self.get_guild_config(guild_id)
+        return copy.deepcopy(config.autorule.get(rule_type))
     
     async def get_all_autorule_configs(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT rule_type, config FROM autorule_rules WHERE guild_id = ?", (guild_id,))
-            results = await cursor.fetchall()
-            rules = {}
-            for rule_type, config in results:
-                rules[rule_type] = json.loads(config)
-            return rules
+        config = await self.get_guild_config(guild_id)
+        return copy.deepcopy(config.autorule)
     
     async def set_autorule_logs_channel(self, guild_id, channel_id):
         await self.set_autorule_rule(guild_id, "logs_channel", {"channel_id": channel_id})
@@ -577,7 +1181,7 @@ class Database:
     
     # Application system methods
     async def set_apply_config(self, guild_id, setting, value):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             cursor = await db.execute("SELECT config FROM apply_config WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             
@@ -596,7 +1200,7 @@ class Database:
             await db.commit()
     
     async def get_apply_config(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT config FROM apply_config WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             if result:
@@ -622,19 +1226,19 @@ class Database:
     
     # Invite system methods
     async def set_invite_logs_channel(self, guild_id, channel_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO invite_logs (guild_id, channel_id) VALUES (?, ?)", 
                            (guild_id, channel_id))
             await db.commit()
     
     async def get_invite_logs_channel(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT channel_id FROM invite_logs WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             return result[0] if result else None
     
     async def get_user_invites(self, guild_id, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT total, joins, leaves, bonus FROM user_invites WHERE guild_id = ? AND user_id = ?", 
                                     (guild_id, user_id))
             result = await cursor.fetchone()
@@ -643,7 +1247,7 @@ class Database:
             return {"total": 0, "joins": 0, "leaves": 0, "bonus": 0}
     
     async def get_guild_invites(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT user_id, total, joins, leaves, bonus FROM user_invites WHERE guild_id = ?", 
                                     (guild_id,))
             results = await cursor.fetchall()
@@ -653,7 +1257,7 @@ class Database:
             return invites
     
     async def add_user_invites(self, guild_id, user_id, amount):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             # Insert or update user invite record
             await db.execute(
                 "INSERT OR IGNORE INTO user_invites (guild_id, user_id, total, joins, leaves, bonus) VALUES (?, ?, 0, 0, 0, 0)",
@@ -668,7 +1272,7 @@ class Database:
             await db.commit()
     
     async def add_user_bonus_invites(self, guild_id, user_id, amount):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             # Insert or update user invite record
             await db.execute(
                 "INSERT OR IGNORE INTO user_invites (guild_id, user_id, total, joins, leaves, bonus) VALUES (?, ?, 0, 0, 0, 0)",
@@ -683,7 +1287,7 @@ class Database:
             await db.commit()
     
     async def remove_user_invites(self, guild_id, user_id, amount):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             # Insert or update user invite record
             await db.execute(
                 "INSERT OR IGNORE INTO user_invites (guild_id, user_id, total, joins, leaves, bonus) VALUES (?, ?, 0, 0, 0, 0)",
@@ -698,41 +1302,47 @@ class Database:
             await db.commit()
     
     async def clear_user_invites(self, guild_id, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM user_invites WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
             await db.commit()
     
     async def clear_guild_invites(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM user_invites WHERE guild_id = ?", (guild_id,))
             await db.commit()
     
     # Extra owner system methods
     async def add_extra_owner(self, guild_id, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR IGNORE INTO extra_owners (guild_id, user_id) VALUES (?, ?)", (guild_id, user_id))
             await db.commit()
+        
+        config = self._touch_guild_config(guild_id)
+        if config:
+            config.extra_owners.add(user_id)
     
     async def remove_extra_owner(self, guild_id, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM extra_owners WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
             await db.commit()
+        
+        config = self._touch_guild_config(guild_id)
+        if config:
+            config.extra_owners.discard(user_id)
     
     async def get_extra_owners(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT user_id FROM extra_owners WHERE guild_id = ?", (guild_id,))
-            results = await cursor.fetchall()
-            return [row[0] for row in results]
+        config = await self.get_guild_config(guild_id)
+        return list(config.extra_owners)
     
     # Verification system methods
     async def set_verify_config(self, guild_id, config):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO verify_config (guild_id, config) VALUES (?, ?)", 
                            (guild_id, json.dumps(config)))
             await db.commit()
     
     async def get_verify_config(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT config FROM verify_config WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             if result:
@@ -740,37 +1350,37 @@ class Database:
             return None
     
     async def reset_verify_config(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM verify_config WHERE guild_id = ?", (guild_id,))
             await db.commit()
     
     # Reaction role system methods
     async def add_reaction_role(self, guild_id, config):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT INTO reaction_roles (guild_id, config) VALUES (?, ?)", 
                            (guild_id, json.dumps(config)))
             await db.commit()
     
     async def get_reaction_roles(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT config FROM reaction_roles WHERE guild_id = ?", (guild_id,))
             results = await cursor.fetchall()
             return [json.loads(row[0]) for row in results]
     
     async def reset_reaction_roles(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM reaction_roles WHERE guild_id = ?", (guild_id,))
             await db.commit()
     
     # User profile system methods
     async def get_user_bio(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT bio FROM user_profiles WHERE user_id = ?", (user_id,))
             result = await cursor.fetchone()
             return result[0] if result else None
     
     async def set_user_bio(self, user_id, bio):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             # Check if user exists
             cursor = await db.execute("SELECT user_id FROM user_profiles WHERE user_id = ?", (user_id,))
             exists = await cursor.fetchone()
@@ -782,13 +1392,13 @@ class Database:
             await db.commit()
     
     async def get_user_commands_used(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT commands_used FROM user_profiles WHERE user_id = ?", (user_id,))
             result = await cursor.fetchone()
             return result[0] if result else 0
     
     async def increment_user_commands(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             # Check if user exists
             cursor = await db.execute("SELECT user_id FROM user_profiles WHERE user_id = ?", (user_id,))
             exists = await cursor.fetchone()
@@ -801,25 +1411,25 @@ class Database:
     
     # Warning system methods
     async def add_warning(self, guild_id, user_id, moderator_id, reason):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT INTO warnings (guild_id, user_id, moderator_id, reason, timestamp) VALUES (?, ?, ?, ?, ?)", 
                            (guild_id, user_id, moderator_id, reason, datetime.now().timestamp()))
             await db.commit()
     
     async def get_user_warnings(self, guild_id, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT reason, moderator_id, timestamp FROM warnings WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
             results = await cursor.fetchall()
             return [{'reason': row[0], 'moderator_id': row[1], 'timestamp': row[2]} for row in results]
     
     async def set_warn_config(self, guild_id, punishment, limit):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO warn_config (guild_id, punishment, warn_limit) VALUES (?, ?, ?)", 
                            (guild_id, punishment, limit))
             await db.commit()
     
     async def get_warn_config(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT punishment, warn_limit FROM warn_config WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             if result:
@@ -827,31 +1437,31 @@ class Database:
             return None
     
     async def clear_user_warnings(self, guild_id, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM warnings WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
             await db.commit()
     
     async def get_all_warned_users(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT user_id, COUNT(*) as warning_count FROM warnings WHERE guild_id = ? GROUP BY user_id ORDER BY warning_count DESC", (guild_id,))
             results = await cursor.fetchall()
             return [{'user_id': row[0], 'warning_count': row[1]} for row in results]
     
     async def get_user_warnings_count(self, guild_id, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT COUNT(*) FROM warnings WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
             result = await cursor.fetchone()
             return result[0] if result else 0
     
     # AFK system methods
     async def set_afk(self, user_id, reason, guild_id=None, global_afk=False):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO afk_users (user_id, reason, global_afk, guild_id) VALUES (?, ?, ?, ?)", 
                            (user_id, reason, global_afk, guild_id))
             await db.commit()
     
     async def get_afk(self, user_id, guild_id=None):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             # Check global AFK first
             cursor = await db.execute("SELECT reason, global_afk, guild_id FROM afk_users WHERE user_id = ? AND global_afk = 1", (user_id,))
             result = await cursor.fetchone()
@@ -868,12 +1478,12 @@ class Database:
             return None
     
     async def remove_afk(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM afk_users WHERE user_id = ?", (user_id,))
             await db.commit()
     
     async def get_all_afk_users(self):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT user_id, reason, global_afk, guild_id FROM afk_users")
             results = await cursor.fetchall()
             return [{
@@ -885,13 +1495,13 @@ class Database:
     
     # Maintenance system methods
     async def set_maintenance_data(self, guild_id, data):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO maintenance_data (guild_id, data) VALUES (?, ?)", 
                            (guild_id, json.dumps(data)))
             await db.commit()
     
     async def get_maintenance_data(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT data FROM maintenance_data WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             if result:
@@ -899,61 +1509,114 @@ class Database:
             return None
     
     async def clear_maintenance_data(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM maintenance_data WHERE guild_id = ?", (guild_id,))
             await db.commit()
     
+    # Guild snapshot methods (antinuke restore)
+    async def get_guild_snapshot(self, guild_id, deleted_since=None):
+        """{kind: {object_id: data}} of live objects plus those deleted after deleted_since"""
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                "SELECT kind, object_id, data FROM guild_snapshots WHERE guild_id = ? AND (deleted_at IS NULL OR deleted_at >= ?)",
+                (guild_id, deleted_since if deleted_since is not None else float('inf'))
+            )
+            rows = await cursor.fetchall()
+        snapshot = {}
+        for kind, object_id, data in rows:
+            snapshot.setdefault(kind, {})[object_id] = json.loads(data)
+        return snapshot
+    
+    async def save_guild_snapshot(self, guild_id, objects, retention=7 * 86400):
+        """Store only what changed since the last snapshot
+        
+        objects maps (kind, object_id) to serialized data. Objects missing from it are
+        marked deleted rather than dropped, so a restore can still bring them back;
+        they are purged after retention seconds. Returns (changed, deleted).
+        """
+        now = time.time()
+        async with self.pool.writer() as db:
+            cursor = await db.execute(
+                "SELECT kind, object_id, data FROM guild_snapshots WHERE guild_id = ? AND deleted_at IS NULL", (guild_id,)
+            )
+            stored = {(kind, object_id): data for kind, object_id, data in await cursor.fetchall()}
+            
+            changed = [(guild_id, kind, object_id, data) for (kind, object_id), data in objects.items() if stored.get((kind, object_id)) != data]
+            deleted = [(now, guild_id, kind, object_id) for kind, object_id in stored.keys() - objects.keys()]
+            if changed:
+                await db.executemany(
+                    """INSERT INTO guild_snapshots (guild_id, kind, object_id, data, deleted_at) VALUES (?, ?, ?, ?, NULL)
+                    ON CONFLICT(guild_id, kind, object_id) DO UPDATE SET data = excluded.data, deleted_at = NULL""",
+                    changed
+                )
+            if deleted:
+                await db.executemany(
+                    "UPDATE guild_snapshots SET deleted_at = ? WHERE guild_id = ? AND kind = ? AND object_id = ?", deleted
+                )
+            await db.execute("DELETE FROM guild_snapshots WHERE guild_id = ? AND deleted_at < ?", (guild_id, now - retention))
+            await db.commit()
+        return len(changed), len(deleted)
+    
     # AI Chat system methods
     async def set_ai_channel(self, guild_id, channel_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO ai_channels (guild_id, channel_id) VALUES (?, ?)", 
                            (guild_id, channel_id))
             await db.commit()
+        
+        config = self._touch_guild_config(guild_id)
+        if config:
+            config.ai_channel = channel_id
     
     async def get_ai_channel(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT channel_id FROM ai_channels WHERE guild_id = ?", (guild_id,))
-            result = await cursor.fetchone()
-            return result[0] if result else None
+        config = await self.get_guild_config(guild_id)
+        return config.ai_channel
     
     async def clear_ai_channel(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM ai_channels WHERE guild_id = ?", (guild_id,))
             await db.commit()
+        
+        config = self._touch_guild_config(guild_id)
+        if config:
+            config.ai_channel = None
     
     # Level system methods
     async def get_user_xp(self, guild_id, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT xp, level FROM user_xp WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
-            result = await cursor.fetchone()
-            if result:
-                return {"xp": result[0], "level": result[1]}
-            return None
+        result = await self.xp.get(guild_id, user_id)
+        if result:
+            return {"xp": result[0], "level": result[1]}
+        return None
     
     async def set_user_xp(self, guild_id, user_id, xp, level):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("INSERT OR REPLACE INTO user_xp (guild_id, user_id, xp, level) VALUES (?, ?, ?, ?)", 
-                           (guild_id, user_id, xp, level))
-            await db.commit()
+        await self.xp.set(guild_id, user_id, xp, level)
+    
+    async def add_user_xp(self, guild_id, user_id, amount, level_of):
+        """Apply an XP gain in memory; returns (old level, new xp, new level)"""
+        return await self.xp.add(guild_id, user_id, amount, level_of)
     
     async def get_leaderboard(self, guild_id, page=0):
-        async with aiosqlite.connect(self.db_path) as db:
-            offset = page * 10
-            cursor = await db.execute("SELECT user_id, xp, level FROM user_xp WHERE guild_id = ? ORDER BY xp DESC LIMIT 10 OFFSET ?", 
-                                    (guild_id, offset))
-            results = await cursor.fetchall()
-            return [{"user_id": row[0], "xp": row[1], "level": row[2]} for row in results]
+        # The ledger holds every row for the guild plus unflushed gains, ranked in memory
+        users = await self.xp.guild(guild_id)
+        ranks = await self.xp.rank_index(guild_id)
+        return [
+            {"user_id": user_id, "xp": xp, "level": users[user_id][1]}
+            for user_id, xp in ranks.page(page * 10, 10)
+        ]
+    
+    async def get_user_rank(self, guild_id, user_id):
+        """1-based XP rank in the guild, or None if the user has no XP"""
+        return (await self.xp.rank_index(guild_id)).rank(user_id)
+    
+    async def flush_xp(self):
+        await self.xp.flush()
     
     async def get_levelup_config(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("SELECT config FROM levelup_config WHERE guild_id = ?", (guild_id,))
-            result = await cursor.fetchone()
-            if result:
-                return json.loads(result[0])
-            return None
+        config = await self.get_guild_config(guild_id)
+        return copy.deepcopy(config.levelup)
     
     async def set_levelup_setting(self, guild_id, setting, value):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             cursor = await db.execute("SELECT config FROM levelup_config WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             
@@ -963,18 +1626,27 @@ class Database:
                 config = {}
             
             config[setting] = value
+            data = json.dumps(config)
             
             await db.execute("INSERT OR REPLACE INTO levelup_config (guild_id, config) VALUES (?, ?)", 
-                           (guild_id, json.dumps(config)))
+                           (guild_id, data))
             await db.commit()
+        
+        snapshot = self._touch_guild_config(guild_id)
+        if snapshot:
+            snapshot.levelup = json.loads(data)
     
     async def reset_levelup_config(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM levelup_config WHERE guild_id = ?", (guild_id,))
             await db.commit()
+        
+        config = self._touch_guild_config(guild_id)
+        if config:
+            config.levelup = None
     
     async def get_canva_config(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT config FROM canva_config WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             if result:
@@ -982,7 +1654,7 @@ class Database:
             return {"enabled": False}
     
     async def set_canva_setting(self, guild_id, setting, value):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             cursor = await db.execute("SELECT config FROM canva_config WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             
@@ -1003,85 +1675,103 @@ class Database:
         return premium_guild is not None
     
     async def set_warn_log_channel(self, guild_id, channel_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("INSERT OR REPLACE INTO warn_log_channels (guild_id, channel_id) VALUES (?, ?)", 
                            (guild_id, channel_id))
             await db.commit()
     
     async def get_warn_log_channel(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT channel_id FROM warn_log_channels WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             return result[0] if result else None
     
     # Message tracking methods
     async def increment_user_messages(self, guild_id, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
-            today = datetime.now().strftime('%Y-%m-%d')
-            
-            # Update all-time messages
-            await db.execute(
-                "INSERT OR IGNORE INTO user_messages (guild_id, user_id, message_count) VALUES (?, ?, 0)",
-                (guild_id, user_id)
-            )
-            await db.execute(
-                "UPDATE user_messages SET message_count = message_count + 1 WHERE guild_id = ? AND user_id = ?",
-                (guild_id, user_id)
-            )
-            
-            # Update daily messages
-            await db.execute(
-                "INSERT OR IGNORE INTO daily_messages (guild_id, user_id, date, message_count) VALUES (?, ?, ?, 0)",
-                (guild_id, user_id, today)
-            )
-            await db.execute(
-                "UPDATE daily_messages SET message_count = message_count + 1 WHERE guild_id = ? AND user_id = ? AND date = ?",
-                (guild_id, user_id, today)
-            )
-            
-            await db.commit()
+        # Buffered in memory; MessageCounterBuffer writes both tables in one batch
+        today = datetime.now().strftime('%Y-%m-%d')
+        self.message_counts.add(guild_id, user_id, today)
+        ranks = self.message_ranks.get(guild_id)
+        if ranks is not None:
+            ranks.update(user_id, ranks.scores.get(user_id, 0) + 1)
+        self.evict_idle_message_ranks()
+    
+    async def flush_message_counts(self):
+        await self.message_counts.flush()
     
     async def get_user_messages(self, guild_id, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute(
                 "SELECT message_count FROM user_messages WHERE guild_id = ? AND user_id = ?",
                 (guild_id, user_id)
             )
             result = await cursor.fetchone()
-            return result[0] if result else 0
+            stored = result[0] if result else 0
+        return stored + self.message_counts.pending_total(guild_id, user_id)
     
     async def get_user_messages_today(self, guild_id, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
-            today = datetime.now().strftime('%Y-%m-%d')
+        today = datetime.now().strftime('%Y-%m-%d')
+        async with self.pool.reader() as db:
             cursor = await db.execute(
                 "SELECT message_count FROM daily_messages WHERE guild_id = ? AND user_id = ? AND date = ?",
                 (guild_id, user_id, today)
             )
             result = await cursor.fetchone()
-            return result[0] if result else 0
+            stored = result[0] if result else 0
+        return stored + self.message_counts.pending_on(guild_id, user_id, today)
+    
+    async def get_message_ranks(self, guild_id):
+        """RankIndex of total messages, loaded once and then kept current by increment_user_messages"""
+        self._message_rank_used[guild_id] = time.monotonic()
+        ranks = self.message_ranks.get(guild_id)
+        if ranks is not None:
+            return ranks
+        
+        task = self._message_rank_loads.get(guild_id)
+        if task is None:
+            task = self._message_rank_loads[guild_id] = asyncio.create_task(self._load_message_ranks(guild_id))
+        return await asyncio.shield(task)
+    
+    async def _load_message_ranks(self, guild_id):
+        try:
+            # Holding the flush lock keeps a batch from moving between the table and the buffer mid-load
+            async with self.message_counts._flush_lock:
+                async with self.pool.reader() as db:
+                    cursor = await db.execute("SELECT user_id, message_count FROM user_messages WHERE guild_id = ?", (guild_id,))
+                    counts = dict(await cursor.fetchall())
+                for (g, user_id, _), count in self.message_counts.pending.items():
+                    if g == guild_id:
+                        counts[user_id] = counts.get(user_id, 0) + count
+                ranks = self.message_ranks[guild_id] = RankIndex(counts)
+            return ranks
+        finally:
+            self._message_rank_loads.pop(guild_id, None)
+    
+    def evict_idle_message_ranks(self):
+        """Drop rank indexes nobody has read for message_rank_ttl; they reload from the table on demand"""
+        now = time.monotonic()
+        if now < self._next_rank_eviction:
+            return
+        self._next_rank_eviction = now + 60
+        cutoff = now - self.message_rank_ttl
+        for guild_id in [g for g, used in self._message_rank_used.items() if used <= cutoff]:
+            self.message_ranks.pop(guild_id, None)
+            self._message_rank_loads.pop(guild_id, None)
+            del self._message_rank_used[guild_id]
     
     async def get_message_leaderboard(self, guild_id, page=0):
-        async with aiosqlite.connect(self.db_path) as db:
-            offset = page * 10
-            cursor = await db.execute(
-                "SELECT user_id, message_count FROM user_messages WHERE guild_id = ? ORDER BY message_count DESC LIMIT 10 OFFSET ?",
-                (guild_id, offset)
-            )
-            results = await cursor.fetchall()
-            return [{'user_id': row[0], 'message_count': row[1]} for row in results]
+        ranks = await self.get_message_ranks(guild_id)
+        return [{'user_id': user_id, 'message_count': count} for user_id, count in ranks.page(page * 10, 10)]
+    
+    async def get_message_rank(self, guild_id, user_id):
+        return (await self.get_message_ranks(guild_id)).rank(user_id)
     
     async def get_total_message_users(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                "SELECT COUNT(*) FROM user_messages WHERE guild_id = ?",
-                (guild_id,)
-            )
-            result = await cursor.fetchone()
-            return result[0] if result else 0
+        return len(await self.get_message_ranks(guild_id))
     
     # Badge system methods
     async def add_user_badge(self, user_id, badge):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute(
                 "INSERT OR IGNORE INTO user_badges (user_id, badge) VALUES (?, ?)",
                 (user_id, badge)
@@ -1089,7 +1779,7 @@ class Database:
             await db.commit()
     
     async def remove_user_badge(self, user_id, badge):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             cursor = await db.execute(
                 "DELETE FROM user_badges WHERE user_id = ? AND badge = ?",
                 (user_id, badge)
@@ -1098,7 +1788,7 @@ class Database:
             return cursor.rowcount > 0
     
     async def get_user_badges(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute(
                 "SELECT badge FROM user_badges WHERE user_id = ?",
                 (user_id,)
@@ -1108,7 +1798,7 @@ class Database:
     
     # YouTube notification methods
     async def set_youtube_config(self, guild_id, setting, value):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             cursor = await db.execute("SELECT config FROM youtube_config WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             
@@ -1124,7 +1814,7 @@ class Database:
             await db.commit()
     
     async def get_youtube_config(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT config FROM youtube_config WHERE guild_id = ?", (guild_id,))
             result = await cursor.fetchone()
             if result:
@@ -1132,7 +1822,7 @@ class Database:
             return {}
     
     async def get_all_youtube_configs(self):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute("SELECT guild_id, config FROM youtube_config")
             results = await cursor.fetchall()
             configs = {}
@@ -1141,13 +1831,13 @@ class Database:
             return configs
     
     async def reset_youtube_config(self, guild_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM youtube_config WHERE guild_id = ?", (guild_id,))
             await db.commit()
     
     # AFK system methods
     async def set_afk(self, user_id, reason, timestamp, dm_enabled):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute(
                 "INSERT OR REPLACE INTO afk_users (user_id, reason, timestamp, dm_enabled) VALUES (?, ?, ?, ?)",
                 (user_id, reason, timestamp.isoformat(), dm_enabled)
@@ -1155,7 +1845,7 @@ class Database:
             await db.commit()
     
     async def get_afk(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.reader() as db:
             cursor = await db.execute(
                 "SELECT reason, timestamp, dm_enabled FROM afk_users WHERE user_id = ?",
                 (user_id,)
@@ -1170,6 +1860,6 @@ class Database:
             return None
     
     async def remove_afk(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute("DELETE FROM afk_users WHERE user_id = ?", (user_id,))
             await db.commit()
\ No newline at end of file
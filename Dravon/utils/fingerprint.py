@@ -0,0 +1,126 @@
+import re
+import time
+import unicodedata
+from collections import deque
+
+_NON_WORD = re.compile(r'[\W_]+')  # Unicode-aware, so non-Latin scripts keep their letters
+_MENTION = re.compile(r'<[@#][!&]?\d+>|https?://\S+')
+
+BITS = 64
+BANDS = 8  # pigeonhole: simhashes within 7 bits share at least one 8-bit band
+BAND_BITS = BITS // BANDS
+MASK = (1 << BITS) - 1
+
+def normalize(text):
+    """Casefold, drop mentions/links/punctuation and collapse whitespace
+    
+    NFKC folds fullwidth and compatibility forms (ｈｉ -> hi), and letters and
+    digits of any script are kept, so non-Latin messages are fingerprinted too.
+    Text made only of emoji or symbols normalizes to "" and is never compared.
+    """
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = _MENTION.sub(' ', text)
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+# Spreads each bit of a byte into its own 8-bit lane, so per-bit counts can be summed as one integer
+_SPREAD = [sum((byte >> i & 1) << (8 * i) for i in range(8)) for byte in range(256)]
+MAX_FEATURES = 255  # lane capacity
+
+def features(text, shingle=4):
+    """Character shingles, evenly sampled down to MAX_FEATURES for long text"""
+    grams = [text[i:i + shingle] for i in range(max(1, len(text) - shingle + 1))]
+    if len(grams) > MAX_FEATURES:
+        step = len(grams) / MAX_FEATURES
+        grams = [grams[int(i * step)] for i in range(MAX_FEATURES)]
+    return grams
+
+def simhash(text):
+    """64-bit SimHash of already-normalized text"""
+    hashes = [hash(gram) & MASK for gram in features(text)]
+    lanes = 0
+    for value in hashes:
+        for byte in range(8):
+            lanes += _SPREAD[value >> (8 * byte) & 255] << (64 * byte)
+    
+    threshold = len(hashes) / 2
+    fingerprint = 0
+    for bit in range(BITS):
+        if (lanes >> (8 * bit) & 255) > threshold:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+class Fingerprint:
+    def __init__(self, value, timestamp, channel_id, user_id, message_id):
+        self.value = value
+        self.timestamp = timestamp
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.message_id = message_id
+
+class FingerprintStore:
+    """Recent message fingerprints for one guild, bounded by age and count
+    
+    Entries live in a time-ordered deque and in one bucket per 8-bit band,
+    so a lookup only compares against messages that share a band.
+    """
+    
+    def __init__(self, window=30, max_entries=5000):
+        self.window = window
+        self.max_entries = max_entries
+        self.entries = deque()
+        self.buckets = {}  # (band, band value) -> deque of Fingerprint
+    
+    def _bands(self, value):
+        for band in range(BANDS):
+            yield band, value >> (band * BAND_BITS) & ((1 << BAND_BITS) - 1)
+    
+    def _expire(self, now):
+        cutoff = now - self.window
+        while self.entries and (self.entries[0].timestamp <= cutoff or len(self.entries) > self.max_entries):
+            self.entries.popleft().timestamp = float('-inf')  # buckets drop it lazily
+    
+    def add_and_match(self, value, channel_id, user_id, message_id, max_distance=6, now=None):
+        """Store a fingerprint and return earlier ones within max_distance bits"""
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        cutoff = now - self.window
+        
+        matches = {}
+        for key in self._bands(value):
+            bucket = self.buckets.get(key)
+            if not bucket:
+                continue
+            while bucket and bucket[0].timestamp <= cutoff:
+                bucket.popleft()
+            for entry in bucket:
+                if entry.timestamp > cutoff and hamming(entry.value, value) <= max_distance:
+                    matches[id(entry)] = entry
+        
+        entry = Fingerprint(value, now, channel_id, user_id, message_id)
+        self.entries.append(entry)
+        for key in self._bands(value):
+            self.buckets.setdefault(key, deque()).append(entry)
+        return list(matches.values())
+    
+    def forget(self, entries):
+        """Drop entries that have been acted on so they don't trigger again"""
+        for entry in entries:
+            entry.timestamp = float('-inf')
+    
+    def evict(self, now=None):
+        """Periodic sweep for buckets that never get looked up again"""
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        cutoff = now - self.window
+        for key in list(self.buckets):
+            bucket = self.buckets[key]
+            while bucket and bucket[0].timestamp <= cutoff:
+                bucket.popleft()
+            if not bucket:
+                del self.buckets[key]
+    
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,202 @@
+import discord
+import asyncio
+import json
+import time
+
+# Channel kinds we know how to recreate
+CHANNEL_TYPES = {
+    discord.ChannelType.text: "text",
+    discord.ChannelType.news: "text",
+    discord.ChannelType.voice: "voice",
+    discord.ChannelType.stage_voice: "stage",
+    discord.ChannelType.forum: "forum",
+}
+
+def _overwrites(channel):
+    """[[target id, is role, allow, deny], ...] for role and member overwrites"""
+    rows = []
+    for target, overwrite in channel.overwrites.items():
+        allow, deny = overwrite.pair()
+        rows.append([target.id, isinstance(target, discord.Role), allow.value, deny.value])
+    return rows
+
+def serialize_guild(guild):
+    """{(kind, object id): compact JSON} for roles, categories and channels"""
+    objects = {}
+    for role in guild.roles:
+        if role.is_default() or role.managed:
+            continue
+        objects[("role", role.id)] = {
+            "name": role.name, "permissions": role.permissions.value, "color": role.color.value,
+            "hoist": role.hoist, "mentionable": role.mentionable, "position": role.position
+        }
+    for category in guild.categories:
+        objects[("category", category.id)] = {
+            "name": category.name, "position": category.position, "overwrites": _overwrites(category)
+        }
+    for channel in guild.channels:
+        kind = CHANNEL_TYPES.get(channel.type)
+        if kind is None:
+            continue
+        data = {
+            "type": kind, "name": channel.name, "position": channel.position,
+            "category": channel.category_id, "overwrites": _overwrites(channel)
+        }
+        if kind in ("text", "forum"):
+            data.update(topic=channel.topic, nsfw=channel.nsfw, slowmode=channel.slowmode_delay)
+        else:
+            data.update(bitrate=channel.bitrate, user_limit=channel.user_limit)
+        objects[("channel", channel.id)] = data
+    return {key: json.dumps(data, separators=(",", ":")) for key, data in objects.items()}
+
+class GuildRestorer:
+    """Recreates what a snapshot has and the live guild lost
+    
+    Work runs in dependency order: roles, then categories, then channels,
+    then overwrites on surviving channels that pointed at recreated roles.
+    Each stage creates its objects concurrently, bounded by a semaphore so
+    the per-guild rate limit is queued rather than tripped.
+    """
+    
+    def __init__(self, guild, snapshot, concurrency=5, reason="AntiNuke restore"):
+        self.guild = guild
+        self.snapshot = snapshot  # {kind: {object id: data}}
+        self.slots = asyncio.Semaphore(concurrency)
+        self.reason = reason
+        self.id_map = {}  # snapshot id -> live object (recreated or surviving)
+        self.restored = {"roles": 0, "categories": 0, "channels": 0, "overwrites": 0}
+        self.failed = 0
+    
+    async def _limited(self, coro):
+        """Run one API call under the semaphore; None on failure, else its result (or True)"""
+        async with self.slots:
+            try:
+                result = await coro
+                return True if result is None else result
+            except discord.HTTPException as e:
+                self.failed += 1
+                print(f"AntiNuke restore step failed in {self.guild.id}: {e}")
+                return None
+    
+    def _missing(self, kind, lookup):
+        items = self.snapshot.get(kind, {})
+        for object_id, data in items.items():
+            live = lookup(object_id)
+            if live is not None:
+                self.id_map[object_id] = live
+        return {object_id: data for object_id, data in items.items() if object_id not in self.id_map}
+    
+    def _build_overwrites(self, rows):
+        overwrites = {}
+        for target_id, is_role, allow, deny in rows:
+            if target_id == self.guild.id:
+                target = self.guild.default_role
+            elif is_role:
+                target = self.id_map.get(target_id) or self.guild.get_role(target_id)
+            else:
+                target = self.guild.get_member(target_id)
+            if target is not None:
+                overwrites[target] = discord.PermissionOverwrite.from_pair(
+                    discord.Permissions(allow), discord.Permissions(deny)
+                )
+        return overwrites
+    
+    async def restore_roles(self):
+        missing = self._missing("role", self.guild.get_role)
+        
+        async def create(object_id, data):
+            role = await self._limited(self.guild.create_role(
+                name=data["name"], permissions=discord.Permissions(data["permissions"]),
+                color=discord.Color(data["color"]), hoist=data["hoist"],
+                mentionable=data["mentionable"], reason=self.reason
+            ))
+            if role:
+                self.id_map[object_id] = role
+                self.restored["roles"] += 1
+        
+        await asyncio.gather(*(create(object_id, data) for object_id, data in missing.items()))
+        
+        # One bulk call puts recreated roles back where they were, below the bot's own role
+        top = self.guild.me.top_role.position
+        positions = {
+            self.id_map[object_id]: min(data["position"], top - 1)
+            for object_id, data in missing.items()
+            if object_id in self.id_map and data["position"] > 0
+        }
+        if positions:
+            await self._limited(self.guild.edit_role_positions(positions, reason=self.reason))
+    
+    async def restore_categories(self):
+        missing = self._missing("category", self.guild.get_channel)
+        
+        async def create(object_id, data):
+            category = await self._limited(self.guild.create_category(
+                data["name"], overwrites=self._build_overwrites(data["overwrites"]),
+                position=data["position"], reason=self.reason
+            ))
+            if category:
+                self.id_map[object_id] = category
+                self.restored["categories"] += 1
+        
+        await asyncio.gather(*(create(object_id, data) for object_id, data in missing.items()))
+    
+    async def restore_channels(self):
+        missing = self._missing("channel", self.guild.get_channel)
+        
+        async def create(object_id, data):
+            options = {
+                "category": self.id_map.get(data["category"]),
+                "position": data["position"],
+                "overwrites": self._build_overwrites(data["overwrites"]),
+                "reason": self.reason
+            }
+            kind = data["type"]
+            if kind in ("text", "forum"):
+                factory = self.guild.create_text_channel if kind == "text" else self.guild.create_forum
+                options.update(nsfw=data.get("nsfw", False), slowmode_delay=data.get("slowmode", 0))
+                if data.get("topic"):
+                    options["topic"] = data["topic"]
+            elif kind == "stage":
+                factory = self.guild.create_stage_channel
+            else:
+                factory = self.guild.create_voice_channel
+                options.update(
+                    bitrate=min(data.get("bitrate", 64000), int(self.guild.bitrate_limit)),
+                    user_limit=data.get("user_limit", 0)
+                )
+            channel = await self._limited(factory(data["name"], **options))
+            if channel:
+                self.id_map[object_id] = channel
+                self.restored["channels"] += 1
+        
+        await asyncio.gather(*(create(object_id, data) for object_id, data in missing.items()))
+    
+    async def restore_overwrites(self):
+        """Surviving channels lose overwrites for deleted roles; point them at the recreated ones"""
+        recreated = {object_id for object_id, role in self.id_map.items() if isinstance(role, discord.Role) and role.id != object_id}
+        if not recreated:
+            return
+        
+        async def repair(channel, rows):
+            for target_id, is_role, allow, deny in rows:
+                if not is_role or target_id not in recreated:
+                    continue
+                overwrite = discord.PermissionOverwrite.from_pair(discord.Permissions(allow), discord.Permissions(deny))
+                if await self._limited(channel.set_permissions(self.id_map[target_id], overwrite=overwrite, reason=self.reason)):
+                    self.restored["overwrites"] += 1
+        
+        jobs = []
+        for kind in ("category", "channel"):
+            for object_id, data in self.snapshot.get(kind, {}).items():
+                channel = self.id_map.get(object_id)
+                if channel is not None and channel.id == object_id:
+                    jobs.append(repair(channel, data["overwrites"]))
+        await asyncio.gather(*jobs)
+    
+    async def run(self):
+        started = time.monotonic()
+        await self.restore_roles()
+        await self.restore_categories()
+        await self.restore_channels()
+        await self.restore_overwrites()
+        return self.restored, self.failed, time.monotonic() - started
@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+def _read_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = path + ".tmp"
+    with open(temp, 'wb') as f:
+        f.write(data)
+    os.replace(temp, path)
+
+def _prune_directory(directory, max_files):
+    """Drop the least recently written files beyond max_files"""
+    try:
+        entries = [entry for entry in os.scandir(directory) if entry.is_file()]
+    except OSError:
+        return
+    if len(entries) <= max_files:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - max_files]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+def asset_key(asset, size):
+    """Cache key for a Discord asset at a size; asset hashes never change in place"""
+    return f"{asset.key}:{size}"
+
+class ImageCache:
+    """Raw bytes of Discord CDN images: memory LRU, then disk, then one shared fetch
+    
+    Keys carry the asset hash, and a new avatar or banner gets a new hash,
+    so entries never go stale and are never revalidated. Concurrent requests
+    for the same key share a single download.
+    """
+    
+    def __init__(self, directory="data/image_cache", max_items=256, max_files=5000, timeout=10):
+        self.directory = directory
+        self.max_items = max_items
+        self.max_files = max_files
+        self.timeout = timeout
+        self.memory = OrderedDict()  # key -> bytes
+        self.loading = {}  # key -> in-flight load task
+        self.session = None
+        self.writes = 0
+        self.stats = {"memory": 0, "disk": 0, "network": 0}
+    
+    def _session(self):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+    
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+    
+    def _remember(self, key, data):
+        self.memory[key] = data
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_items:
+            self.memory.popitem(last=False)
+    
+    async def _load(self, key, url):
+        path = self._path(key)
+        data = await asyncio.to_thread(_read_file, path)
+        if data is not None:
+            self.stats["disk"] += 1
+        else:
+            async with self._session().get(url) as resp:
+                if resp.status != 200:
+                    return None
+                data = await resp.read()
+            self.stats["network"] += 1
+            try:
+                await asyncio.to_thread(_write_file, path, data)
+                self.writes += 1
+                if self.writes % 100 == 0:
+                    await asyncio.to_thread(_prune_directory, self.directory, self.max_files)
+            except OSError as e:
+                print(f"⚠️ Could not store cached image: {e}")
+        self._remember(key, data)
+        return data
+    
+    async def get(self, key, url):
+        """Bytes for key, downloading url only if neither memory nor disk has it"""
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory.move_to_end(key)
+            self.stats["memory"] += 1
+            return data
+        
+        task = self.loading.get(key)
+        if task is None:
+            task = self.loading[key] = asyncio.create_task(self._load(key, url))
+            task.add_done_callback(lambda _: self.loading.pop(key, None))
+        return await asyncio.shield(task)
+    
+    async def get_asset(self, asset, size):
+        """Bytes of a discord.Asset as a static PNG at size"""
+        asset = asset.with_static_format('png').with_size(size)
+        return await self.get(asset_key(asset, size), asset.url)
+    
+    async def close(self):
+        for task in self.loading.values():
+            task.cancel()
+        self.loading.clear()
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
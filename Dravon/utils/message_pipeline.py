@@ -0,0 +1,80 @@
+import asyncio
+import traceback
+
+class MessageContext:
+    """Per-message state built once and shared by every pipeline handler"""
+    
+    def __init__(self, message, config=None):
+        self.message = message
+        self.guild = message.guild
+        self.author = message.author
+        self.channel = message.channel
+        self.config = config  # GuildConfig snapshot, None in DMs
+        self.content = message.content
+        self.content_lower = message.content.lower()
+        self.is_owner = bool(self.guild) and self.author.id == self.guild.owner_id
+        self.is_whitelisted = self.is_owner or bool(config and config.is_whitelisted(self.author.id))
+        self.deleted = False
+        self.deleted_by = None
+    
+    def mark_deleted(self, handler):
+        self.deleted = True
+        self.deleted_by = handler
+
+class MessageHandler:
+    def __init__(self, name, callback, priority, concurrent, guild_only):
+        self.name = name
+        self.callback = callback
+        self.priority = priority
+        self.concurrent = concurrent
+        self.guild_only = guild_only
+
+class MessagePipeline:
+    """Single on_message stage that runs cog handlers in priority order
+    
+    Sequential handlers (filters that may delete) run inline, lowest priority
+    first, and the pipeline stops as soon as one of them deletes the message.
+    Concurrent handlers (trackers, responders) then start together in one
+    background task so slow I/O never holds up command processing.
+    """
+    
+    def __init__(self):
+        self.handlers = []
+        self._background = set()
+    
+    def register(self, name, callback, priority=100, concurrent=False, guild_only=True):
+        self.unregister(name)
+        self.handlers.append(MessageHandler(name, callback, priority, concurrent, guild_only))
+        self.handlers.sort(key=lambda handler: handler.priority)
+    
+    def unregister(self, name):
+        self.handlers = [handler for handler in self.handlers if handler.name != name]
+    
+    async def _run(self, handler, ctx):
+        try:
+            await handler.callback(ctx)
+        except Exception as e:
+            print(f"❌ Message handler {handler.name} failed: {e}")
+            traceback.print_exc()
+    
+    async def dispatch(self, ctx):
+        concurrent = []
+        for handler in self.handlers:
+            if handler.guild_only and not ctx.guild:
+                continue
+            if handler.concurrent:
+                concurrent.append(handler)
+                continue
+            
+            await self._run(handler, ctx)
+            if ctx.deleted:
+                return ctx
+        
+        if concurrent:
+            task = asyncio.create_task(self._run_concurrent(concurrent, ctx))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        return ctx
+    
+    async def _run_concurrent(self, handlers, ctx):
+        await asyncio.gather(*(self._run(handler, ctx) for handler in handlers))
@@ -0,0 +1,122 @@
+import discord
+import asyncio
+import heapq
+import itertools
+
+class _Job:
+    __slots__ = ("key", "action", "severity", "priority", "future", "started")
+    
+    def __init__(self, key, action, severity, priority, future):
+        self.key = key
+        self.action = action
+        self.severity = severity
+        self.priority = priority
+        self.future = future
+        self.started = False
+
+class PunishmentExecutor:
+    """Per-guild priority queues of antinuke punishments
+    
+    Each guild with queued jobs is drained by up to per_guild worker tasks
+    (one rate-limit bucket per guild), started on submit and gone once its
+    queue is empty, so a backlog in one guild never holds up another. At
+    most max_calls punishments run at once across all guilds. Critical
+    threats jump their guild's queue, and a second submit for an actor
+    already queued joins the pending job instead of punishing twice. If the
+    second submit is more severe (ban over quarantine) or more urgent, the
+    pending job is upgraded to it; once a job has started, a more severe
+    one is queued after it.
+    """
+    
+    PRIORITIES = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3}
+    SEVERITY = {"strip_roles": 1, "quarantine": 2, "kick": 3, "ban": 4}
+    
+    def __init__(self, max_calls=16, per_guild=2, retries=2):
+        self.per_guild = per_guild
+        self.retries = retries
+        self.calls = asyncio.Semaphore(max_calls)
+        self.queues = {}  # guild_id -> heap of (priority, order, job), only while the guild has work
+        self.guild_tasks = {}  # guild_id -> worker tasks draining that guild's queue
+        self.pending = {}  # (guild_id, user_id) -> queued or running _Job
+        self._order = itertools.count()
+    
+    def _put(self, job):
+        guild_id = job.key[0]
+        heapq.heappush(self.queues.setdefault(guild_id, []), (job.priority, next(self._order), job))
+        tasks = self.guild_tasks.setdefault(guild_id, set())
+        if len(tasks) < self.per_guild:
+            tasks.add(asyncio.create_task(self._drain(guild_id)))
+    
+    def submit(self, guild_id, user_id, action, threat_level="HIGH", severity=0):
+        """Queue action (a coroutine function) and return a future for its result
+        
+        severity ranks actions against each other (see SEVERITY); the most
+        severe action submitted for an actor before its job starts is the one
+        that runs.
+        """
+        key = (guild_id, user_id)
+        priority = self.PRIORITIES.get(threat_level, 1)
+        job = self.pending.get(key)
+        if job is not None and not job.future.done():
+            if not job.started:
+                if severity > job.severity:
+                    job.action, job.severity = action, severity
+                if priority < job.priority:
+                    job.priority = priority
+                    self._put(job)  # the old queue entry is skipped once the job has run
+                return job.future
+            if severity <= job.severity:
+                return job.future
+        
+        job = self.pending[key] = _Job(key, action, severity, priority, asyncio.get_running_loop().create_future())
+        self._put(job)
+        return job.future
+    
+    async def _attempt(self, action):
+        for attempt in range(self.retries + 1):
+            try:
+                return await action()
+            except discord.HTTPException as e:
+                # discord.py already waits out 429s; retry transient server errors only
+                if e.status < 500 or attempt == self.retries:
+                    raise
+                await asyncio.sleep(0.5 * (attempt + 1))
+    
+    async def _drain(self, guild_id):
+        queue = self.queues[guild_id]
+        try:
+            while queue:
+                _, _, job = heapq.heappop(queue)
+                if job.started:
+                    continue  # a stale entry left behind by a priority upgrade
+                job.started = True
+                try:
+                    async with self.calls:
+                        result = await self._attempt(job.action)
+                    if not job.future.done():
+                        job.future.set_result(result)
+                except Exception as e:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                finally:
+                    if self.pending.get(job.key) is job:
+                        del self.pending[job.key]
+        finally:
+            # No await since the queue was last seen empty, so no submit can slip in between
+            tasks = self.guild_tasks.get(guild_id, set())
+            tasks.discard(asyncio.current_task())
+            if not tasks:
+                self.guild_tasks.pop(guild_id, None)
+                if not queue:
+                    self.queues.pop(guild_id, None)
+    
+    async def close(self):
+        tasks = [task for tasks in self.guild_tasks.values() for task in tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self.pending.values():
+            job.future.cancel()
+        self.pending.clear()
+        self.queues.clear()
+        self.guild_tasks.clear()
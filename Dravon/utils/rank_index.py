@@ -0,0 +1,135 @@
+from bisect import bisect_left, insort
+
+class RankIndex:
+    """Leaderboard order for one guild: score updates, rank-of and page-at-offset
+    
+    Keys are (-score, user_id) kept in sorted buckets of about BUCKET entries.
+    A Fenwick tree over the bucket sizes turns "how many entries come before
+    bucket i" and "which bucket holds position p" into O(log n) walks, so a
+    rank or a page never scans the table, and an update only shifts one bucket.
+    """
+    
+    BUCKET = 512
+    
+    def __init__(self, scores=None):
+        self.scores = {}  # user_id -> score
+        self.buckets = [[]]
+        self.maxes = [None]  # last key of each bucket, for bisecting to a bucket
+        self.tree = [0, 0]  # Fenwick tree over bucket sizes, 1-based
+        if scores:
+            self._bulk_load(scores)
+    
+    def _bulk_load(self, scores):
+        self.scores = dict(scores)
+        keys = sorted((-score, user_id) for user_id, score in self.scores.items())
+        self.buckets = [keys[i:i + self.BUCKET] for i in range(0, len(keys), self.BUCKET)] or [[]]
+        self._reindex()
+    
+    def _reindex(self):
+        self.maxes = [bucket[-1] if bucket else None for bucket in self.buckets]
+        size = len(self.buckets)
+        self.tree = [0] * (size + 1)
+        for i, bucket in enumerate(self.buckets, 1):
+            self.tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent <= size:
+                self.tree[parent] += self.tree[i]
+    
+    def _adjust(self, bucket_index, delta):
+        i = bucket_index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+    
+    def _before(self, bucket_index):
+        """Entries in buckets before bucket_index"""
+        total, i = 0, bucket_index
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+    
+    def _locate(self, position):
+        """(bucket index, offset inside it) of the 0-based position"""
+        index, remaining = 0, position
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            nxt = index + step
+            if nxt < len(self.tree) and self.tree[nxt] <= remaining:
+                index = nxt
+                remaining -= self.tree[nxt]
+            step >>= 1
+        return index, remaining
+    
+    def _bucket_for(self, key):
+        lo, hi = 0, len(self.maxes) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.maxes[mid] is not None and self.maxes[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+    
+    def _insert(self, key):
+        index = self._bucket_for(key)
+        bucket = self.buckets[index]
+        insort(bucket, key)
+        self.maxes[index] = bucket[-1]
+        if len(bucket) > self.BUCKET * 2:
+            half = len(bucket) // 2
+            self.buckets[index:index + 1] = [bucket[:half], bucket[half:]]
+            self._reindex()
+        else:
+            self._adjust(index, 1)
+    
+    def _remove(self, key):
+        index = self._bucket_for(key)
+        bucket = self.buckets[index]
+        position = bisect_left(bucket, key)
+        if position < len(bucket) and bucket[position] == key:
+            del bucket[position]
+            if not bucket and len(self.buckets) > 1:
+                del self.buckets[index]
+                self._reindex()
+            else:
+                self.maxes[index] = bucket[-1] if bucket else None
+                self._adjust(index, -1)
+    
+    def update(self, user_id, score):
+        old = self.scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            self._remove((-old, user_id))
+        self.scores[user_id] = score
+        self._insert((-score, user_id))
+    
+    def remove(self, user_id):
+        old = self.scores.pop(user_id, None)
+        if old is not None:
+            self._remove((-old, user_id))
+    
+    def rank(self, user_id):
+        """1-based rank, or None if the user has no score"""
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        key = (-score, user_id)
+        index = self._bucket_for(key)
+        return self._before(index) + bisect_left(self.buckets[index], key) + 1
+    
+    def page(self, offset, limit):
+        """[(user_id, score), ...] for ranks offset+1 .. offset+limit"""
+        if offset >= len(self.scores):
+            return []
+        index, inner = self._locate(offset)
+        results = []
+        while index < len(self.buckets) and len(results) < limit:
+            for neg_score, user_id in self.buckets[index][inner:inner + limit - len(results)]:
+                results.append((user_id, -neg_score))
+            index, inner = index + 1, 0
+        return results
+    
+    def __len__(self):
+        return len(self.scores)
@@ -0,0 +1,135 @@
+import heapq
+import itertools
+import time
+from collections import deque
+
+class SlidingWindowCounter:
+    """Per-key event timestamps over a sliding window, on the monotonic clock
+    
+    Each hit appends one timestamp and pops the expired ones from the front,
+    so the cost per event is amortized O(1). Keys that have been quiet for
+    longer than idle_ttl are dropped by evict_idle().
+    """
+    
+    def __init__(self, window, idle_ttl=None, max_events=None):
+        self.window = window
+        self.idle_ttl = idle_ttl or window * 2
+        self.max_events = max_events  # cap per key; the window never needs more
+        self.events = {}  # key -> deque of timestamps
+    
+    def _trim(self, timestamps, now, window):
+        cutoff = now - window
+        while timestamps and timestamps[0] <= cutoff:
+            timestamps.popleft()
+    
+    def hit(self, key, now=None, window=None):
+        """Record an event and return how many fall inside the window"""
+        now = time.monotonic() if now is None else now
+        window = window or self.window
+        timestamps = self.events.get(key)
+        if timestamps is None:
+            timestamps = self.events[key] = deque(maxlen=self.max_events)
+        self._trim(timestamps, now, window)
+        timestamps.append(now)
+        return len(timestamps)
+    
+    def count(self, key, now=None, window=None):
+        timestamps = self.events.get(key)
+        if not timestamps:
+            return 0
+        now = time.monotonic() if now is None else now
+        self._trim(timestamps, now, window or self.window)
+        return len(timestamps)
+    
+    def reset(self, key):
+        self.events.pop(key, None)
+    
+    def evict_idle(self, now=None):
+        """Drop keys with no events in idle_ttl; returns how many were removed"""
+        now = time.monotonic() if now is None else now
+        cutoff = now - self.idle_ttl
+        idle = [key for key, timestamps in self.events.items() if not timestamps or timestamps[-1] <= cutoff]
+        for key in idle:
+            del self.events[key]
+        return len(idle)
+    
+    def __len__(self):
+        return len(self.events)
+
+class CooldownMap:
+    """Keys on cooldown until a deadline, on the monotonic clock
+    
+    Deadlines also sit in a min-heap, so every call first pops whatever has
+    expired and the map only ever holds keys still cooling down. Keys are
+    tuples, namespaced by their first item, e.g. ("levelup", guild_id, user_id).
+    """
+    
+    def __init__(self):
+        self.deadlines = {}  # key -> monotonic deadline
+        self.heap = []  # (deadline, seq, key)
+        self._seq = itertools.count()  # tie-break so keys are never compared
+        self.expired = 0
+    
+    def _expire(self, now):
+        heap = self.heap
+        while heap and heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(heap)
+            if self.deadlines.get(key) == deadline:
+                del self.deadlines[key]
+                self.expired += 1
+    
+    def remaining(self, key, now=None):
+        """Seconds left on key's cooldown, 0 if it is not cooling down"""
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        deadline = self.deadlines.get(key)
+        return deadline - now if deadline is not None else 0
+    
+    def trigger(self, key, duration, now=None):
+        """Start key's cooldown and return True, or False if it is still running"""
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        if key in self.deadlines:
+            return False
+        deadline = self.deadlines[key] = now + duration
+        heapq.heappush(self.heap, (deadline, next(self._seq), key))
+        return True
+    
+    def reset(self, key):
+        # The heap entry is skipped when it surfaces
+        self.deadlines.pop(key, None)
+    
+    def stats(self):
+        self._expire(time.monotonic())
+        return {"keys": len(self.deadlines), "heap": len(self.heap), "expired": self.expired}
+    
+    def __len__(self):
+        return len(self.deadlines)
+
+class MessageRateTracker:
+    """Spam and raid counters: per (guild, user), per channel and per guild"""
+    
+    def __init__(self, window=10, max_user_events=50):
+        self.users = SlidingWindowCounter(window, idle_ttl=300, max_events=max_user_events)
+        self.channels = SlidingWindowCounter(window, idle_ttl=300)
+        self.guilds = SlidingWindowCounter(window, idle_ttl=300)
+    
+    def record(self, guild_id, channel_id, user_id, window=None, now=None):
+        """Count one message everywhere and return the user's count in their window"""
+        now = time.monotonic() if now is None else now
+        self.channels.hit(channel_id, now)
+        self.guilds.hit(guild_id, now)
+        return self.users.hit((guild_id, user_id), now, window)
+    
+    def channel_rate(self, channel_id):
+        """Messages per second in a channel over the window"""
+        return self.channels.count(channel_id) / self.channels.window
+    
+    def guild_rate(self, guild_id):
+        return self.guilds.count(guild_id) / self.guilds.window
+    
+    def evict_idle(self):
+        return self.users.evict_idle() + self.channels.evict_idle() + self.guilds.evict_idle()
+    
+    def stats(self):
+        return {"users": len(self.users), "channels": len(self.channels), "guilds": len(self.guilds)}
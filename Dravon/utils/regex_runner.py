@@ -0,0 +1,131 @@
+import asyncio
+import multiprocessing
+import re
+
+COMBINED_CACHE = 256
+
+def _combined(patterns, cache):
+    """One alternation of every pattern, or None if they can't share one (e.g. a repeated group name)"""
+    if patterns not in cache:
+        if len(cache) >= COMBINED_CACHE:
+            cache.clear()
+        try:
+            cache[patterns] = re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+        except re.error:
+            cache[patterns] = None
+    return cache[patterns]
+
+def _serve(conn, current):
+    """Child loop: (patterns, text, prefilter) in, index of the first match (or None) out"""
+    conn.send(None)  # ready; the parent starts its timeout only after this
+    cache = {}
+    while True:
+        try:
+            patterns, text, prefilter = conn.recv()
+        except EOFError:
+            return
+        result = None
+        # Most messages match nothing, and one scan of the alternation proves it
+        combined = _combined(patterns, cache) if prefilter else None
+        if combined is None or combined.search(text):
+            for index, pattern in enumerate(patterns):
+                current.value = index  # read by the parent if this search times out
+                if re.search(pattern, text):
+                    result = index
+                    break
+        current.value = -1
+        conn.send(result)
+
+class RegexTimeout(Exception):
+    def __init__(self, index):
+        super().__init__(index)
+        self.index = index  # position of the pattern that was running, or None for the alternation
+
+class _Child:
+    """One search process and its pipe"""
+    
+    def __init__(self, context):
+        parent, child = context.Pipe()
+        self.current = context.Value('i', -1, lock=False)
+        self.process = context.Process(target=_serve, args=(child, self.current), daemon=True)
+        self.process.start()
+        child.close()
+        self.conn = parent
+        self.conn.recv()  # wait out interpreter startup before any search is timed
+    
+    def alive(self):
+        return self.process.is_alive()
+    
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+class RegexRunner:
+    """Runs user-supplied regexes in child processes that are killed on timeout
+    
+    re holds the GIL and can't be interrupted, so a search that backtracks
+    badly would freeze the bot even from a worker thread. Here it only costs
+    one child process: after timeout seconds it is killed, replaced on the
+    next search, and the caller learns which pattern was running. Up to
+    workers searches run at once, so one slow guild can't hold up the rest.
+    """
+    
+    def __init__(self, timeout=0.25, workers=4):
+        self.timeout = timeout
+        self.context = multiprocessing.get_context("forkserver")  # never fork the threaded bot
+        self.slots = asyncio.Semaphore(workers)
+        self.idle = []  # started children waiting for a search
+        self.children = set()
+    
+    async def _acquire(self, loop):
+        while self.idle:
+            child = self.idle.pop()
+            if child.alive():
+                return child
+            self._discard(child)
+        child = await loop.run_in_executor(None, _Child, self.context)
+        self.children.add(child)
+        return child
+    
+    def _discard(self, child):
+        child.kill()
+        self.children.discard(child)
+    
+    async def search(self, patterns, text, prefilter=True):
+        """Index of the first pattern that matches text, or None; raises RegexTimeout
+        
+        With prefilter, the patterns are first tried as one alternation and
+        only checked one by one if that finds something.
+        """
+        if not patterns:
+            return None
+        loop = asyncio.get_running_loop()
+        async with self.slots:
+            try:
+                child = await self._acquire(loop)
+            except (EOFError, OSError) as e:
+                print(f"⚠️ Could not start regex worker: {e}")
+                return None
+            
+            try:
+                child.conn.send((tuple(patterns), text, prefilter))
+                # poll() waits on the pipe without holding the GIL
+                if await loop.run_in_executor(None, child.conn.poll, self.timeout):
+                    result = child.conn.recv()
+                    self.idle.append(child)
+                    child = None
+                    return result
+                index = child.current.value
+                raise RegexTimeout(index if index >= 0 else None)
+            except (EOFError, OSError):
+                return None
+            finally:
+                # A timed out, broken or cancelled search may still answer; never reuse that pipe
+                if child is not None:
+                    self._discard(child)
+    
+    def close(self):
+        for child in list(self.children):
+            self._discard(child)
+        self.idle = []
@@ -0,0 +1,207 @@
+import re
+from collections import deque
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+# One-to-one substitutions so match offsets still line up with the original text
+LEETSPEAK = str.maketrans({
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's',
+    '7': 't', '8': 'b', '@': 'a', '$': 's'
+})
+
+def normalize(text, leetspeak=False):
+    text = text.lower()
+    if leetspeak:
+        text = text.translate(LEETSPEAK)
+    return text
+
+MAX_REGEX_LENGTH = 200
+
+def regex_problem(pattern):
+    """Why pattern is unsafe to run on every message, or None if it is fine
+    
+    Python's re backtracks and holds the GIL, so a slow search can't be
+    interrupted. Instead, the constructs behind catastrophic backtracking
+    (a variable repeat inside another repeat, alternation under a repeat,
+    backreferences) are refused up front, along with very long patterns.
+    """
+    if len(pattern) > MAX_REGEX_LENGTH:
+        return f"patterns are limited to {MAX_REGEX_LENGTH} characters"
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error as e:
+        return f"invalid pattern: {e}"
+    return _scan_regex(parsed, False)
+
+def _scan_regex(items, repeated):
+    for op, av in items:
+        if op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS):
+            return "backreferences are not allowed"
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None)):
+            low, high, body = av
+            if repeated and low != high:
+                return "nested quantifiers like (a+)+ are not allowed"
+            if high > 1 and any(inner_op == sre_parse.BRANCH for inner_op, _ in _flatten(body)):
+                return "alternation inside a repeat like (a|ab)+ is not allowed"
+            problem = _scan_regex(body, repeated or high > 1)
+        elif op == sre_parse.SUBPATTERN:
+            problem = _scan_regex(av[-1], repeated)
+        elif op == sre_parse.BRANCH:
+            problem = next(filter(None, (_scan_regex(branch, repeated) for branch in av[1])), None)
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            problem = _scan_regex(av[1], repeated)
+        elif op == getattr(sre_parse, "ATOMIC_GROUP", None):
+            problem = _scan_regex(av, repeated)
+        else:
+            problem = None
+        if problem:
+            return problem
+    return None
+
+def _flatten(items):
+    """Every (op, av) in a parsed pattern, groups included"""
+    for op, av in items:
+        yield op, av
+        if op == sre_parse.SUBPATTERN:
+            yield from _flatten(av[-1])
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            yield from _flatten(av[2])
+        elif op == sre_parse.BRANCH:
+            for branch in av[1]:
+                yield from _flatten(branch)
+
+class AhoCorasick:
+    """Multi-pattern automaton: one pass over the text finds every pattern"""
+    
+    def __init__(self, patterns=()):
+        self.goto = [{}]  # node -> {char: node}
+        self.fail = [0]
+        self.output = [()]  # node -> patterns ending here (incl. via fail links)
+        self.terminal = [None]  # node -> pattern that ends exactly here
+        self._dirty = False
+        for pattern in patterns:
+            self.add(pattern)
+    
+    def add(self, pattern):
+        """Insert into the trie; fail links are relinked lazily on next search"""
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            nxt = self.goto[node].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][char] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+                self.terminal.append(None)
+            node = nxt
+        self.terminal[node] = pattern
+        self._dirty = True
+    
+    def _link(self):
+        queue = deque()
+        for child in self.goto[0].values():
+            self.fail[child] = 0
+            queue.append(child)
+        self.output[0] = ()
+        
+        while queue:
+            node = queue.popleft()
+            own = (self.terminal[node],) if self.terminal[node] else ()
+            self.output[node] = own + self.output[self.fail[node]]
+            
+            for char, child in self.goto[node].items():
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                target = self.goto[state].get(char, 0)
+                self.fail[child] = target if target != child else 0
+                queue.append(child)
+        self._dirty = False
+    
+    def finditer(self, text):
+        """Yield (start, end, pattern) for every occurrence in text"""
+        if self._dirty:
+            self._link()
+        goto, fail, output = self.goto, self.fail, self.output
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for pattern in output[node]:
+                yield index - len(pattern) + 1, index + 1, pattern
+
+class PrefixTrie:
+    """Finds every stored key that is a prefix of a text in one walk"""
+    
+    END = None  # marker key; never collides with a character
+    
+    def __init__(self, items=()):
+        self.root = {}
+        for key, value in items:
+            self.add(key, value)
+    
+    def add(self, key, value):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+        node[self.END] = value
+    
+    def prefixes_of(self, text):
+        node = self.root
+        if self.END in node:
+            yield node[self.END]
+        for char in text:
+            node = node.get(char)
+            if node is None:
+                return
+            if self.END in node:
+                yield node[self.END]
+    
+class WordFilter:
+    """Compiled word list for one guild with boundary and leetspeak modes"""
+    
+    def __init__(self, words=(), word_boundary=False, leetspeak=False):
+        self.word_boundary = word_boundary
+        self.leetspeak = leetspeak
+        self.words = set()
+        self.automaton = AhoCorasick()
+        self.update(words)
+    
+    def _prepare(self, word):
+        return normalize(word.strip(), self.leetspeak)
+    
+    def update(self, words):
+        """Sync to a new word list, only rebuilding when something was removed"""
+        words = {word for word in (self._prepare(w) for w in words) if word}
+        if words == self.words:
+            return
+        
+        if self.words - words:
+            self.automaton = AhoCorasick(words)
+        else:
+            for word in words - self.words:
+                self.automaton.add(word)
+        self.words = words
+    
+    def _is_boundary(self, text, start, end):
+        before = text[start - 1] if start > 0 else ' '
+        after = text[end] if end < len(text) else ' '
+        return not before.isalnum() and not after.isalnum()
+    
+    def find(self, text, normalized=None):
+        """Return the first blocked word in text, or None"""
+        if not self.words:
+            return None
+        if normalized is None:
+            normalized = normalize(text, self.leetspeak)
+        for start, end, word in self.automaton.finditer(normalized):
+            if not self.word_boundary or self._is_boundary(normalized, start, end):
+                return word
+        return None